@@ -16,7 +16,8 @@ setup(
     author_email='contacto@develat.io',
     url='https://github.com/develatio/django-tradukoj/',
     license='BSD',
-    install_requires=['Django>=2.0', 'langcodes >= 1.4.1'],
+    install_requires=['Django>=2.2', 'langcodes >= 1.4.1'],
+    extras_require={'brotli': ['brotli']},
     classifiers=[
         "Development Status :: 5 - Production/Stable",
         "Environment :: Web Environment",
@@ -1 +1,8 @@
 default_app_config = 'tradukoj.apps.TradukojConfig'
+
+
+def gettext(namespace, key, langtag=None, default=None):
+    """Return translation of a key from the in-process catalog, see
+    tradukoj.catalog."""
+    from .catalog import gettext as catalog_gettext
+    return catalog_gettext(namespace, key, langtag, default)
@@ -16,8 +16,15 @@ class TranslationAdmin(admin.ModelAdmin):
     raw_id_fields = ('key', )
 
 
+class GetTextFileAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'done', 'done_with_errors', 'started_date',
+                    'finished_date')
+    readonly_fields = ('done', 'done_with_errors', 'started_date',
+                       'finished_date', 'log')
+
+
 admin.site.register(models.TranslationKey, TranslationKeyAdmin)
-admin.site.register(models.GetTextFile)
+admin.site.register(models.GetTextFile, GetTextFileAdmin)
 admin.site.register(models.Namespace)
 admin.site.register(models.Translation, TranslationAdmin)
 admin.site.register(models.BCP47)
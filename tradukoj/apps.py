@@ -1,7 +1,23 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.signals import request_started
+from django.db.models.signals import post_migrate
 
 
 class TradukojConfig(AppConfig):
     name = 'tradukoj'
     def ready(self):
         from . import signals as _signals
+        from .executors import resume_imports
+        from .warm import warm_cache_after_migrate, warm_cache_on_first_request
+
+        request_started.connect(
+            resume_imports, dispatch_uid='tradukoj_resume_imports')
+
+        if getattr(settings, 'TRADUKOJ_WARM_ON_MIGRATE', False):
+            post_migrate.connect(warm_cache_after_migrate, sender=self)
+        if getattr(settings, 'TRADUKOJ_WARM_ON_STARTUP', False):
+            # not from ready(), management commands would warm cache too
+            request_started.connect(
+                warm_cache_on_first_request,
+                dispatch_uid='tradukoj_warm_on_startup')
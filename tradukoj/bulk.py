@@ -0,0 +1,385 @@
+"""
+Bulk write helpers.
+
+These helpers write lots of rows with a fixed number of queries, bypassing
+django signals, so they take care of cache invalidation by themselves.
+
+"""
+import time
+from contextlib import contextmanager
+from django import VERSION as DJANGO_VERSION
+from django.db import connections, router, transaction
+from .cache import mark_dirty
+
+BATCH_SIZE = 1000
+
+
+def split_translation_text(text):
+    """Return (is_largue, small, largue) values of a translation text."""
+    if len(text) > 255:
+        return True, None, text
+    return False, text, None
+
+
+def supports_update_conflicts(using):
+    return (DJANGO_VERSION >= (4, 1) and getattr(
+        connections[using].features, 'supports_update_conflicts_with_target',
+        False))
+
+
+def supports_ignore_conflicts(using):
+    return getattr(connections[using].features, 'supports_ignore_conflicts',
+                   False)
+
+
+class QueryStats:
+    """Count queries and time spent inside a `track()` block."""
+
+    def __init__(self, using):
+        self.using = using
+        self.queries = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+    @contextmanager
+    def track(self):
+        start = time.monotonic()
+        try:
+            with connections[self.using].execute_wrapper(self):
+                yield self
+        finally:
+            self.seconds += time.monotonic() - start
+
+    def rate(self, rows):
+        if not self.seconds:
+            return 0.0
+        return rows / self.seconds
+
+
+def chunks(items, size=BATCH_SIZE):
+    items = list(items)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def get_or_create_ids(model, field, values, using, batch_size=BATCH_SIZE,
+                      on_create=None, **defaults):
+    """Return a {value: id} dict of model rows with field in values, missing
+    rows are created with defaults.
+
+    on_create(values) is called with missing values once they are inserted,
+    as bulk inserts send no signals.
+
+    """
+    queryset = model.objects.using(using).order_by('-pk')
+    ids = {}
+    for chunk in chunks(values, batch_size):
+        # lower pk wins on duplicated values
+        ids.update(
+            queryset.filter(**{
+                f'{field}__in': chunk
+            }).values_list(field, 'id'))
+    missing = [value for value in values if value not in ids]
+    if not missing:
+        return ids
+
+    model.objects.using(using).bulk_create(
+        [model(**{field: value}, **defaults) for value in missing],
+        batch_size=batch_size,
+        ignore_conflicts=supports_ignore_conflicts(using),
+    )
+    if on_create is not None:
+        on_create(missing)
+    for chunk in chunks(missing, batch_size):
+        ids.update(
+            queryset.filter(**{
+                f'{field}__in': chunk
+            }).values_list(field, 'id'))
+    return ids
+
+
+def get_or_create_langtag_ids(langtags, using, batch_size=BATCH_SIZE):
+    """Return a {langtag: BCP47 id} dict, missing langtags are created
+    enabled.
+
+    Cached langtag lists are dropped once created ones are commited.
+
+    """
+    from .models import BCP47, invalidate_langtags
+
+    return get_or_create_ids(
+        BCP47,
+        'langtag',
+        list(langtags),
+        using,
+        batch_size,
+        on_create=lambda _langtags: transaction.on_commit(
+            invalidate_langtags, using=using),
+        enabled=True)
+
+
+def create_missing_keys(namespace_id, texts, using, batch_size=BATCH_SIZE):
+    """Create TranslationKey rows of namespace for texts.
+
+    Return a {text: key_id} dict with every key of the namespace and the
+    number of created keys.
+
+    """
+    from .models import TranslationKey
+
+    keys = dict(
+        TranslationKey.objects.using(using).filter(
+            namespace_id=namespace_id).values_list('text', 'id'))
+    missing = [text for text in texts if text not in keys]
+    if not missing:
+        return keys, 0
+
+    TranslationKey.objects.using(using).bulk_create(
+        [
+            TranslationKey(namespace_id=namespace_id, text=text)
+            for text in missing
+        ],
+        batch_size=batch_size,
+        ignore_conflicts=supports_ignore_conflicts(using),
+    )
+    keys = dict(
+        TranslationKey.objects.using(using).filter(
+            namespace_id=namespace_id).values_list('text', 'id'))
+    return keys, len(missing)
+
+
+def upsert_translations(texts,
+                        existing,
+                        using,
+                        batch_size=BATCH_SIZE,
+                        revision=0):
+    """Insert or update translations.
+
+    texts is a {(key_id, bcp47_id): text} dict and existing a
+    {(key_id, bcp47_id): Translation} dict with the current rows. Written
+    rows are saved with revision, see revisions.py.
+
+    Return a {(key_id, bcp47_id): status} dict, where status is one of
+    'created', 'updated' or 'unchanged'.
+
+    """
+    from .models import Translation
+
+    results = {}
+    to_create = []
+    to_update = []
+    for (key_id, bcp47_id), text in texts.items():
+        is_largue, small, largue = split_translation_text(text)
+        translation = existing.get((key_id, bcp47_id))
+        if translation is None:
+            to_create.append(
+                Translation(
+                    key_id=key_id,
+                    bcp47_id=bcp47_id,
+                    is_largue=is_largue,
+                    small=small,
+                    largue=largue,
+                    revision=revision))
+            results[(key_id, bcp47_id)] = 'created'
+            continue
+
+        if (translation.is_largue, translation.small,
+                translation.largue) == (is_largue, small, largue):
+            results[(key_id, bcp47_id)] = 'unchanged'
+            continue
+
+        translation.is_largue = is_largue
+        translation.small = small
+        translation.largue = largue
+        translation.revision = revision
+        to_update.append(translation)
+        results[(key_id, bcp47_id)] = 'updated'
+
+    fields = ['is_largue', 'small', 'largue', 'revision']
+    if to_create:
+        kwargs = {}
+        if supports_update_conflicts(using):
+            # rows created by others since we read existing ones
+            kwargs = {
+                'update_conflicts': True,
+                'unique_fields': ['key', 'bcp47'],
+                'update_fields': fields,
+            }
+        Translation.objects.using(using).bulk_create(
+            to_create, batch_size=batch_size, **kwargs)
+    if to_update:
+        Translation.objects.using(using).bulk_update(
+            to_update, fields, batch_size=batch_size)
+
+    return results
+
+
+def import_pofile(gettext_file, po_file, batch_size=BATCH_SIZE):
+    """Import entries of a polib file into GetTextFile namespace and lang.
+
+    Existing keys and translations are loaded with one query each, then
+    changes are written in batches inside a transaction.
+
+    Return a dict with import stats.
+
+    """
+    from .models import Translation
+    from .revisions import next_revision
+
+    using = router.db_for_write(Translation)
+    stats = QueryStats(using)
+    texts = {}
+    for entry in po_file:
+        texts[entry.msgid] = entry.msgstr
+
+    with stats.track(), transaction.atomic(using=using):
+        keys, created_keys = create_missing_keys(
+            gettext_file.namespace_id, texts, using, batch_size)
+        existing = {(translation.key_id, translation.bcp47_id): translation
+                    for translation in Translation.objects.using(using).filter(
+                        key__namespace_id=gettext_file.namespace_id,
+                        bcp47_id=gettext_file.bcp47_id,
+                    ).only('id', 'key_id', 'bcp47_id', 'is_largue', 'small',
+                           'largue')}
+        results = upsert_translations(
+            {(keys[msgid], gettext_file.bcp47_id): msgstr
+             for msgid, msgstr in texts.items()},
+            existing,
+            using,
+            batch_size,
+            next_revision(gettext_file.namespace_id, using),
+        )
+        transaction.on_commit(
+            # written rows already have their revision
+            lambda: Translation.invalidate_trees(
+                [gettext_file.bcp47.langtag], [gettext_file.namespace.text]),
+            using=using)
+
+    statuses = list(results.values())
+    return {
+        'entries': len(texts),
+        'created_keys': created_keys,
+        'created': statuses.count('created'),
+        'updated': statuses.count('updated'),
+        'unchanged': statuses.count('unchanged'),
+        'queries': stats.queries,
+        'seconds': stats.seconds,
+        'rows_per_second': stats.rate(len(texts)),
+    }
+
+
+def bulk_translate(translations, using, batch_size=BATCH_SIZE):
+    """Write translations of many keys.
+
+    translations is a {(namespace, key text): {langtag: text}} dict, missing
+    namespaces, keys and langtags are created. Rows are read and written in
+    batches inside a transaction.
+
+    Return a {(namespace, key text): {langtag: status}} dict, where status is
+    one of 'created', 'updated' or 'unchanged'.
+
+    """
+    from .models import Translation
+    from .namespaces import get_namespace_ids
+    from .revisions import next_revision
+
+    langtags = {
+        langtag
+        for texts in translations.values() for langtag in texts
+    }
+    keys_by_namespace = {}
+    for namespace, key_text in translations:
+        keys_by_namespace.setdefault(namespace, []).append(key_text)
+
+    with transaction.atomic(using=using):
+        namespace_ids = get_namespace_ids(keys_by_namespace, create=True)
+        bcp47_ids = get_or_create_langtag_ids(langtags, using, batch_size)
+
+        results = {}
+        for namespace, key_texts in keys_by_namespace.items():
+            keys, _created = create_missing_keys(
+                namespace_ids[namespace], key_texts, using, batch_size)
+            texts = {}
+            for key_text in key_texts:
+                for langtag, text in translations[(namespace,
+                                                   key_text)].items():
+                    texts[(keys[key_text], bcp47_ids[langtag])] = text
+
+            existing = {}
+            for chunk in chunks({key_id for key_id, _ in texts}, batch_size):
+                existing.update({
+                    (translation.key_id, translation.bcp47_id): translation
+                    for translation in Translation.objects.using(using).filter(
+                        key_id__in=chunk,
+                        bcp47_id__in=bcp47_ids.values(),
+                    ).only('id', 'key_id', 'bcp47_id', 'is_largue', 'small',
+                           'largue')
+                })
+            statuses = upsert_translations(
+                texts, existing, using, batch_size,
+                next_revision(namespace_ids[namespace], using))
+            for key_text in key_texts:
+                results[(namespace, key_text)] = {
+                    langtag: statuses[(keys[key_text], bcp47_ids[langtag])]
+                    for langtag in translations[(namespace, key_text)]
+                }
+
+        transaction.on_commit(
+            lambda: mark_dirty(list(langtags), list(keys_by_namespace)),
+            using=using)
+
+    return results
+
+
+def bulk_create_keys(keys, using, batch_size=BATCH_SIZE):
+    """Insert unsaved TranslationKey instances and their init_translations.
+
+    Keys get their pk, re-read by namespace and text on backends not
+    returning them from bulk inserts. Call it inside a transaction.
+
+    """
+    from .models import Namespace, TranslationKey
+    from .revisions import next_revision
+
+    TranslationKey.objects.using(using).bulk_create(
+        keys, batch_size=batch_size)
+    missing = {}
+    for key in keys:
+        if key.pk is None:
+            missing.setdefault(key.namespace_id, {})[key.text] = key
+    for namespace_id, namespace_keys in missing.items():
+        for chunk in chunks(namespace_keys, batch_size):
+            for text, pk in TranslationKey.objects.using(using).filter(
+                    namespace_id=namespace_id,
+                    text__in=chunk).values_list('text', 'id'):
+                namespace_keys[text].pk = pk
+
+    translated = [key for key in keys if key.init_translations]
+    if not translated:
+        return
+
+    langtags = {
+        langtag
+        for key in translated for langtag in key.init_translations
+    }
+    bcp47_ids = get_or_create_langtag_ids(langtags, using, batch_size)
+    texts_by_namespace = {}
+    for key in translated:
+        texts = texts_by_namespace.setdefault(key.namespace_id, {})
+        for langtag, text in key.init_translations.items():
+            texts[(key.pk, bcp47_ids[langtag])] = text
+        key.init_translations = None
+
+    for namespace_id, texts in texts_by_namespace.items():
+        # keys are new, so there are no existing translations
+        upsert_translations(texts, {}, using, batch_size,
+                            next_revision(namespace_id, using))
+
+    namespaces = list(
+        Namespace.objects.using(using).filter(
+            pk__in=texts_by_namespace).values_list('text', flat=True))
+    transaction.on_commit(
+        lambda: mark_dirty(list(langtags), namespaces), using=using)
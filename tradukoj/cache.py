@@ -0,0 +1,692 @@
+"""
+Cache handling for the JSON trees of translations.
+
+Every langtag/namespace tree is cached twice, under `tradukoj_pub_tr_*` for
+public keys and `tradukoj_priv_tr_*` for all keys. Write events patch the
+affected nodes of those trees instead of dropping them (see signals.py),
+once per tree and transaction.
+
+Bulk writes that bypass signals (`queryset.update`, `bulk_create`...) should
+call `Translation.refresh_langtag_cache` or `Translation.invalidate_langtag_cache`
+once they are done.
+
+Trees are cached as a bundle: the rendered UTF-8 JSON bytes (`json`) next
+to its content hash (`etag`), so views can serve them without re-encoding.
+Bundles also keep gzip (and brotli, if its module is installed) compressed
+bytes into `encoded`, produced once when the tree is stored. Built trees
+are compressed at the highest levels, patched ones and merged fallback
+bundles at fast levels to keep writes cheap.
+
+Workers keep the last used bundles into a local LRU cache bounded by size.
+Every namespace has a generation token into the shared cache, changed on
+every write of its trees (not on rebuilds that keep their content), so the
+local copy is only used while the token does not change.
+
+Built trees are also saved into db as snapshots, read back when they are
+missing from cache while their namespace revision does not change. Stale
+trees are always rebuilt from translations.
+
+Trees of a langtag merged with the trees of its fallback chain are cached
+under `tradukoj_pub_fb_*` and `tradukoj_priv_fb_*`, valid while the
+namespace generation and the chain do not change. They are merged by one
+worker at a time too, while the previous bundle is served.
+
+Only one worker rebuilds a tree at a time (a lock is stored into the cache),
+the rest of them serve the previous tree if any, or wait for the new one.
+Trees become stale after TRADUKOJ_CACHE_SOFT_TIMEOUT seconds or when marked
+as dirty, and stale trees are served while they are rebuilt.
+
+Settings:
+    TRADUKOJ_CACHE_TIMEOUT: cache timeout of trees, default cache timeout
+        is used if not set.
+    TRADUKOJ_CACHE_SOFT_TIMEOUT: seconds before a tree should be rebuilt,
+        None (default) to rebuild only dirty trees.
+    TRADUKOJ_CACHE_LOCK_TIMEOUT: max seconds of a tree rebuild, default 30.
+    TRADUKOJ_CACHE_LOCK_WAIT: max seconds to wait for a tree rebuilt by
+        other worker before building it, default 5.
+    TRADUKOJ_LOCAL_CACHE_MAX_BYTES: max size of bundles kept by each worker,
+        default 32MB, 0 disables local cache.
+    TRADUKOJ_CACHE_COMPRESS: store compressed bundles, default True.
+    TRADUKOJ_CACHE_SNAPSHOTS: keep built trees into db, default True (see
+        snapshots.py).
+
+"""
+import gzip
+import hashlib
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import partial
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from .transactions import transaction_buffer
+from .trees import insert_node, remove_node, merge_trees
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+LOCK_POLL_INTERVAL = 0.05
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 9
+PATCH_GZIP_LEVEL = 1
+PATCH_BROTLI_QUALITY = 1
+
+_state = threading.local()
+
+
+def get_cache_timeout():
+    return getattr(settings, 'TRADUKOJ_CACHE_TIMEOUT', DEFAULT_TIMEOUT)
+
+
+def get_cache_soft_timeout():
+    return getattr(settings, 'TRADUKOJ_CACHE_SOFT_TIMEOUT', None)
+
+
+def get_lock_timeout():
+    return getattr(settings, 'TRADUKOJ_CACHE_LOCK_TIMEOUT', 30)
+
+
+def get_lock_wait():
+    return getattr(settings, 'TRADUKOJ_CACHE_LOCK_WAIT', 5)
+
+
+def get_local_cache_max_bytes():
+    return getattr(settings, 'TRADUKOJ_LOCAL_CACHE_MAX_BYTES',
+                   32 * 1024 * 1024)
+
+
+def get_cache_compress():
+    return getattr(settings, 'TRADUKOJ_CACHE_COMPRESS', True)
+
+
+def entry_size(entry):
+    """Return bytes of a bundle, compressed variants included."""
+    return len(entry['json']) + sum(
+        len(content) for content in entry.get('encoded', {}).values())
+
+
+class LocalCache:
+    """Thread-safe LRU of bundles bounded by their size."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._size = 0
+
+    def get(self, cache_key, generation):
+        with self._lock:
+            item = self._entries.get(cache_key)
+            if item is None or item[0] != generation:
+                return None
+            self._entries.move_to_end(cache_key)
+            return item[1]
+
+    def set(self, cache_key, generation, entry):
+        max_bytes = get_local_cache_max_bytes()
+        size = entry_size(entry)
+        with self._lock:
+            self._discard(cache_key)
+            if size > max_bytes:
+                return
+            self._entries[cache_key] = (generation, entry, size)
+            self._size += size
+            while self._size > max_bytes:
+                self._discard(next(iter(self._entries)))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _discard(self, cache_key):
+        item = self._entries.pop(cache_key, None)
+        if item is not None:
+            self._size -= item[2]
+
+
+local_cache = LocalCache()
+
+
+def tree_cache_key(langtag, namespace, public=True):
+    if public:
+        return 'tradukoj_pub_tr_{0}_{1}'.format(langtag, namespace)
+    return 'tradukoj_priv_tr_{0}_{1}'.format(langtag, namespace)
+
+
+def _generation_key(namespace):
+    return f'tradukoj_gen_{namespace}'
+
+
+def get_generation(namespace):
+    """Return current generation token of namespace trees."""
+    generation_key = _generation_key(namespace)
+    generation = cache.get(generation_key)
+    if generation is None:
+        cache.add(generation_key, uuid.uuid4().hex, None)
+        generation = cache.get(generation_key)
+    return generation
+
+
+def get_generations(namespaces):
+    """Return a {namespace: generation token} dict with a single cache read."""
+    generation_keys = {
+        _generation_key(namespace): namespace
+        for namespace in namespaces
+    }
+    generations = {
+        generation_keys[generation_key]: generation
+        for generation_key, generation in cache.get_many(
+            generation_keys).items()
+    }
+    for namespace in namespaces:
+        if namespace not in generations:
+            generations[namespace] = get_generation(namespace)
+    return generations
+
+
+def bump_generations(namespaces):
+    """Change generation token of namespaces once their trees are written."""
+    cache.set_many({
+        _generation_key(namespace): uuid.uuid4().hex
+        for namespace in namespaces
+    }, None)
+
+
+def fallback_cache_key(langtag, namespace, public=True):
+    if public:
+        return 'tradukoj_pub_fb_{0}_{1}'.format(langtag, namespace)
+    return 'tradukoj_priv_fb_{0}_{1}'.format(langtag, namespace)
+
+
+def _lock_key(cache_key):
+    return f'{cache_key}_lock'
+
+
+def _dirty_key(cache_key):
+    return f'{cache_key}_dirty'
+
+
+def acquire_lock(cache_key):
+    """Try to lock a tree, return the lock token or None."""
+    token = uuid.uuid4().hex
+    if cache.add(_lock_key(cache_key), token, get_lock_timeout()):
+        return token
+    return None
+
+
+def release_lock(cache_key, token):
+    if cache.get(_lock_key(cache_key)) == token:
+        cache.delete(_lock_key(cache_key))
+
+
+def is_entry(entry):
+    # ignore trees cached by old versions
+    return isinstance(entry, dict) and 'json' in entry
+
+
+def load_entry(cache_key):
+    """Return the cached entry of a tree or None."""
+    entry = cache.get(cache_key)
+    if not is_entry(entry):
+        return None
+    return entry
+
+
+def render_tree(data):
+    """Return UTF-8 JSON bytes of a tree, as DRF JSONRenderer does."""
+    return json.dumps(
+        data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def is_stale(entry):
+    return entry['expires'] is not None and entry['expires'] <= time.time()
+
+
+def new_expires():
+    soft_timeout = get_cache_soft_timeout()
+    if soft_timeout is None:
+        return None
+    return time.time() + soft_timeout
+
+
+def compress_content(content, fast=False):
+    """Return a {content coding: compressed bytes} dict of content.
+
+    fast trades compression ratio for speed.
+
+    """
+    if not get_cache_compress():
+        return {}
+    encoded = {
+        'gzip':
+        gzip.compress(
+            content, compresslevel=PATCH_GZIP_LEVEL if fast else GZIP_LEVEL)
+    }
+    if brotli is not None:
+        encoded['br'] = brotli.compress(
+            content, quality=PATCH_BROTLI_QUALITY if fast else BROTLI_QUALITY)
+    return encoded
+
+
+def render_entry(data, fast=False, **extra):
+    """Return a cache entry of a tree: its json bytes, compressed variants
+    and hash."""
+    return content_entry(render_tree(data), fast=fast, **extra)
+
+
+def content_entry(content, etag=None, fast=False, **extra):
+    """Return a cache entry of rendered json bytes."""
+    return dict(
+        json=content,
+        etag=etag or hashlib.sha1(content).hexdigest(),
+        encoded=compress_content(content, fast),
+        **extra)
+
+
+def store_tree(langtag, namespace, data, public=True, expires=None,
+               fast=False):
+    """Save a built tree into cache and return the cached entry.
+
+    expires is the timestamp the tree becomes stale, None never. fast
+    compresses the tree at fast levels.
+
+    """
+    return store_entry(langtag, namespace,
+                       render_entry(data, fast, expires=expires), public)
+
+
+def store_entry(langtag, namespace, entry, public=True):
+    """Save a cache entry of a tree and return it.
+
+    Namespace generation changes only when the tree content does: rebuilds of
+    unchanged or missing trees keep local copies and catalogs, as writes bump
+    generations by themselves (see patch_tree and mark_dirty).
+
+    """
+    cache_key = tree_cache_key(langtag, namespace, public)
+    previous = load_entry(cache_key)
+    cache.set(cache_key, entry, get_cache_timeout())
+    if previous is not None and previous['etag'] != entry['etag']:
+        bump_generations([namespace])
+    return entry
+
+
+def rebuild_tree(langtag, namespace, build, public=True, snapshot=False):
+    """Build a tree calling build() and save it into cache.
+
+    Return the cached entry. If the tree is marked as dirty meanwhile, the
+    saved tree will be stale. snapshot reads a current snapshot of the tree
+    instead of building it, set it only when the tree is missing from cache.
+
+    """
+    pair = (langtag, namespace)
+    return rebuild_trees([pair], lambda _pairs: {pair: build()}, public,
+                         [pair] if snapshot else ())[pair]
+
+
+def rebuild_trees(pairs, build_many, public=True, snapshot_pairs=()):
+    """Build trees calling build_many(pairs) and save them into cache.
+
+    build_many must return a {(langtag, namespace): tree} dict. Trees of
+    snapshot_pairs, the ones missing from cache, are read from their current
+    snapshot instead if any, see snapshots.py. Stale or forced rebuilds are
+    always built from translations. Return a {(langtag, namespace): entry}
+    dict with cached entries.
+
+    """
+    from .snapshots import Snapshots, get_snapshots_enabled
+
+    dirty_keys = {
+        _dirty_key(tree_cache_key(langtag, namespace, public)):
+        (langtag, namespace)
+        for langtag, namespace in pairs
+    }
+    cache.delete_many(list(dirty_keys))
+    snapshots = None
+    missing = pairs
+    if get_snapshots_enabled():
+        snapshots = Snapshots(pairs, public, snapshot_pairs)
+        missing = [pair for pair in pairs if pair not in snapshots.contents]
+    built = build_many(missing) if missing else {}
+
+    expires = new_expires()
+    entries = {}
+    for langtag, namespace in pairs:
+        if (langtag, namespace) in built:
+            entries[(langtag, namespace)] = store_tree(
+                langtag, namespace, built[(langtag, namespace)], public,
+                expires)
+            continue
+        content, etag = snapshots.contents[(langtag, namespace)]
+        entries[(langtag, namespace)] = store_entry(
+            langtag, namespace, content_entry(content, etag, expires=expires),
+            public)
+    if snapshots is not None and built:
+        snapshots.save({pair: entries[pair] for pair in built})
+
+    for dirty_key in cache.get_many(list(dirty_keys)):
+        langtag, namespace = dirty_keys[dirty_key]
+        mark_dirty([langtag], [namespace], public)
+    return entries
+
+
+def get_tree(langtag, namespace, build, public=True):
+    """Return the cached entry of a tree.
+
+    build() is called to rebuild the tree if needed.
+
+    """
+    cache_key = tree_cache_key(langtag, namespace, public)
+    if get_local_cache_max_bytes():
+        generation = get_generation(namespace)
+        entry = local_cache.get(cache_key, generation)
+        if entry is not None and not is_stale(entry):
+            return entry
+
+        entry = _get_shared_tree(langtag, namespace, build, public)
+        local_cache.set(cache_key, generation, entry)
+        return entry
+
+    return _get_shared_tree(langtag, namespace, build, public)
+
+
+def _get_shared_tree(langtag, namespace, build, public=True):
+    cache_key = tree_cache_key(langtag, namespace, public)
+    entry = load_entry(cache_key)
+    if entry is not None and not is_stale(entry):
+        return entry
+
+    token = acquire_lock(cache_key)
+    if token is not None:
+        try:
+            return rebuild_tree(langtag, namespace, build, public,
+                                entry is None)
+        finally:
+            release_lock(cache_key, token)
+
+    # other worker is rebuilding this tree
+    if entry is not None:
+        return entry
+
+    deadline = time.monotonic() + get_lock_wait()
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        entry = load_entry(cache_key)
+        if entry is not None:
+            return entry
+
+    return rebuild_tree(langtag, namespace, build, public, True)
+
+
+def get_trees(pairs, build_many, public=True):
+    """Return a {(langtag, namespace): entry} dict of pairs.
+
+    Trees are read with a single cache.get_many, and missing ones are built
+    calling build_many(pairs) once, see rebuild_trees.
+
+    """
+    pairs = list(dict.fromkeys(pairs))
+    cache_keys = {pair: tree_cache_key(*pair, public) for pair in pairs}
+    entries = {}
+
+    generations = {}
+    if get_local_cache_max_bytes():
+        generations = get_generations({namespace for _, namespace in pairs})
+        for pair in pairs:
+            entry = local_cache.get(cache_keys[pair], generations[pair[1]])
+            if entry is not None and not is_stale(entry):
+                entries[pair] = entry
+
+    pending = [pair for pair in pairs if pair not in entries]
+    cached = cache.get_many([cache_keys[pair] for pair in pending])
+    locked = {}
+    missing = []
+    waiting = []
+    for pair in pending:
+        entry = cached.get(cache_keys[pair])
+        if not is_entry(entry):
+            entry = None
+        if entry is not None and not is_stale(entry):
+            entries[pair] = entry
+            continue
+
+        token = acquire_lock(cache_keys[pair])
+        if token is not None:
+            locked[pair] = token
+            if entry is None:
+                missing.append(pair)
+        elif entry is not None:
+            # other worker is rebuilding this tree
+            entries[pair] = entry
+        else:
+            waiting.append(pair)
+
+    if locked:
+        try:
+            entries.update(
+                rebuild_trees(list(locked), build_many, public, missing))
+        finally:
+            for pair, token in locked.items():
+                release_lock(cache_keys[pair], token)
+
+    for pair in waiting:
+        entries[pair] = _get_shared_tree(
+            pair[0], pair[1], partial(_build_one, build_many, pair), public)
+
+    if generations:
+        for pair in pending:
+            local_cache.set(cache_keys[pair], generations[pair[1]],
+                            entries[pair])
+    return {pair: entries[pair] for pair in pairs}
+
+
+def get_fallback_tree(langtag, namespace, chain, build_many, public=True):
+    """Return the cached entry of langtag tree merged with fallback trees.
+
+    chain is the list of langtags from most to less specific, their trees
+    are read with get_trees(). Translations of more specific langtags win.
+    As trees, only one worker merges a bundle at a time, the rest of them
+    serve the previous bundle if any, or wait for the new one.
+
+    """
+    cache_key = fallback_cache_key(langtag, namespace, public)
+    version = '{0}:{1}'.format(get_generation(namespace), ','.join(chain))
+    if get_local_cache_max_bytes():
+        entry = local_cache.get(cache_key, version)
+        if entry is not None:
+            return entry
+
+    entry = load_entry(cache_key)
+    if entry is None or entry['version'] != version:
+        entry = _get_shared_fallback_tree(cache_key, entry, langtag,
+                                          namespace, chain, build_many,
+                                          public, version)
+
+    # previous bundles are served while merging, do not keep them
+    if get_local_cache_max_bytes() and entry['version'] == version:
+        local_cache.set(cache_key, version, entry)
+    return entry
+
+
+def _get_shared_fallback_tree(cache_key, entry, langtag, namespace, chain,
+                              build_many, public, version):
+    merge = partial(_merge_fallback_tree, cache_key, langtag, namespace,
+                    chain, build_many, public, version)
+    token = acquire_lock(cache_key)
+    if token is not None:
+        try:
+            return merge()
+        finally:
+            release_lock(cache_key, token)
+
+    # other worker is merging this bundle
+    if entry is not None:
+        return entry
+
+    deadline = time.monotonic() + get_lock_wait()
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        entry = load_entry(cache_key)
+        if entry is not None:
+            return entry
+
+    return merge()
+
+
+def _merge_fallback_tree(cache_key, langtag, namespace, chain, build_many,
+                         public, version):
+    entries = get_trees([(fallback, namespace) for fallback in chain],
+                        build_many, public)
+    data = {}
+    for fallback in reversed(chain):
+        tree = json.loads(entries[(fallback, namespace)]['json'])
+        merge_trees(data, tree[fallback][namespace])
+    # merged again on every namespace write, as patched trees
+    entry = render_entry({langtag: {namespace: data}}, fast=True,
+                         version=version)
+    cache.set(cache_key, entry, get_cache_timeout())
+    return entry
+
+
+def _build_one(build_many, pair):
+    return build_many([pair])[pair]
+
+
+def merge_entries(entries):
+    """Merge cached trees into a single {langtag: {namespace: tree}} bundle.
+
+    entries is a {(langtag, namespace): entry} dict, their json bytes are
+    joined without decoding them.
+
+    """
+    langtags = OrderedDict()
+    hashes = hashlib.sha1()
+    for (langtag, namespace), entry in entries.items():
+        # entry json is {"langtag":{"namespace":tree}}
+        start = len(render_tree(langtag)) + len(render_tree(namespace)) + 4
+        langtags.setdefault(langtag, []).append(
+            render_tree(namespace) + b':' + entry['json'][start:-2])
+        hashes.update(entry['etag'].encode())
+
+    content = b','.join(
+        render_tree(langtag) + b':{' + b','.join(namespaces) + b'}'
+        for langtag, namespaces in langtags.items())
+    return {'json': b'{' + content + b'}', 'etag': hashes.hexdigest()}
+
+
+def mark_dirty(langtags, namespaces, public=None):
+    """Mark cached trees as stale, so they will be rebuilt on next read.
+
+    public=None marks both public and private trees.
+
+    """
+    cache_keys = []
+    for langtag in langtags:
+        for namespace in namespaces:
+            if public is None or public:
+                cache_keys.append(tree_cache_key(langtag, namespace, True))
+            if public is None or not public:
+                cache_keys.append(tree_cache_key(langtag, namespace, False))
+    if not cache_keys:
+        return
+
+    # warn running rebuilds that they could be using old data
+    cache.set_many({_dirty_key(cache_key): 1
+                    for cache_key in cache_keys}, get_lock_timeout())
+
+    stale_entries = {}
+    for cache_key, entry in cache.get_many(cache_keys).items():
+        if not is_entry(entry):
+            continue
+        entry['expires'] = 0
+        stale_entries[cache_key] = entry
+    if stale_entries:
+        cache.set_many(stale_entries, get_cache_timeout())
+    bump_generations(namespaces)
+
+
+def patch_tree(langtag, namespace, changes, public=True):
+    """Patch the nodes of a cached tree.
+
+    changes is an iterable of (key_text, translation) tuples, a None or
+    blank translation removes the node. If the tree is not cached there is
+    nothing to do: it will be built from db on next read. If a change can
+    not be applied safely, or the tree is being rebuilt, the tree is marked
+    as dirty.
+
+    """
+    cache_key = tree_cache_key(langtag, namespace, public)
+    token = acquire_lock(cache_key)
+    if token is None:
+        mark_dirty([langtag], [namespace], public)
+        return
+
+    try:
+        entry = load_entry(cache_key)
+        if entry is None or is_stale(entry):
+            # nothing to patch, but local copies of the namespace are old
+            bump_generations([namespace])
+            return
+
+        data = json.loads(entry['json'])
+        root = data[langtag][namespace]
+        for key_text, translation in changes:
+            if translation and translation.strip():
+                patched = insert_node(root, key_text, translation, strict=True)
+            else:
+                patched = remove_node(root, key_text)
+            if not patched:
+                mark_dirty([langtag], [namespace], public)
+                return
+
+        # patches are frequent, rebuilds compress the tree better
+        store_tree(langtag, namespace, data, public, entry['expires'],
+                   fast=True)
+    finally:
+        release_lock(cache_key, token)
+
+
+def patch_tree_on_commit(langtag, namespace, changes, public=True,
+                         using=None):
+    """Patch a tree once current transaction commits.
+
+    Changes of a transaction are merged by tree, so every tree is patched
+    once however many rows were written. Outside transactions the tree is
+    patched right away.
+
+    """
+    patches = transaction_buffer('patches', _flush_patches, using)
+    if patches is None:
+        patch_tree(langtag, namespace, changes, public)
+        return
+    patches.setdefault((langtag, namespace, public), {}).update(changes)
+
+
+def _flush_patches(patches):
+    for (langtag, namespace, public), changes in patches.items():
+        patch_tree(langtag, namespace, list(changes.items()), public)
+
+
+@contextmanager
+def suspend_cache_signals():
+    """Disable signal-driven cache patching in current thread.
+
+    Useful on bulk writes that fire lots of signals (like cascade deletes),
+    remember to invalidate affected trees once done.
+
+    """
+    _state.suspended = getattr(_state, 'suspended', 0) + 1
+    try:
+        yield
+    finally:
+        _state.suspended -= 1
+
+
+def cache_signals_suspended():
+    return getattr(_state, 'suspended', 0) > 0
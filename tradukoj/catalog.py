@@ -0,0 +1,151 @@
+"""
+In-process catalog of translations for server-side lookups.
+
+Translations of a langtag/namespace are loaded with a single query into a
+flat {key text: translation} dict, private keys included, and kept while the
+generation token of the namespace (see cache.py) does not change. Tokens are
+checked at most once every TRADUKOJ_CATALOG_CHECK_INTERVAL seconds (default
+1, 0 checks on every lookup), so lookups are served from memory.
+
+    from tradukoj import gettext
+
+    gettext('mynamespace', 'home.title', 'es-AR')
+
+Settings:
+    TRADUKOJ_CATALOG_CHECK_INTERVAL: max seconds a catalog is used without
+        checking its generation token, default 1.
+
+"""
+import threading
+import time
+from django.conf import settings
+from .cache import get_generation
+from .namespaces import get_namespace_id
+
+
+def get_check_interval():
+    return getattr(settings, 'TRADUKOJ_CATALOG_CHECK_INTERVAL', 1)
+
+
+class Catalog:
+    """Thread-safe flat dicts of translations by langtag and namespace."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._messages = {}
+        # {namespace: (generation, checked timestamp)}
+        self._generations = {}
+        # {langtag: (fallback chain, checked timestamp)}
+        self._chains = {}
+
+    def get(self, namespace, key, langtag=None):
+        """Return translation of key, following langtag fallback chain.
+
+        Default langtags are used if langtag is None. Return None if there is
+        no translation.
+
+        """
+        generation = self._check(namespace)
+        chain = self._chain(langtag)
+        messages = {
+            chain_langtag: self._messages.get((chain_langtag, namespace))
+            for chain_langtag in chain
+        }
+        missing = [
+            chain_langtag for chain_langtag, langtag_messages in
+            messages.items() if langtag_messages is None
+        ]
+        if missing:
+            messages.update(self._load(namespace, missing, generation))
+
+        for chain_langtag in chain:
+            if key in messages[chain_langtag]:
+                return messages[chain_langtag][key]
+        return None
+
+    def clear(self):
+        with self._lock:
+            self._messages.clear()
+            self._generations.clear()
+            self._chains.clear()
+
+    def _check(self, namespace):
+        """Drop namespace messages if its generation changed.
+
+        Return current generation.
+
+        """
+        now = time.monotonic()
+        generation, checked = self._generations.get(namespace, (None, None))
+        if checked is not None and now - checked < get_check_interval():
+            return generation
+
+        current = get_generation(namespace)
+        with self._lock:
+            if current != generation:
+                for pair in [
+                        pair for pair in self._messages if pair[1] == namespace
+                ]:
+                    del self._messages[pair]
+            self._generations[namespace] = (current, now)
+        return current
+
+    def _chain(self, langtag):
+        from .models import fallback_chain, langtag_fallbacks
+
+        now = time.monotonic()
+        chain, checked = self._chains.get(langtag, (None, None))
+        if checked is not None and now - checked < get_check_interval():
+            return chain
+
+        if langtag is None:
+            chain = list(langtag_fallbacks()[1])
+        else:
+            chain = fallback_chain(langtag)
+        self._chains[langtag] = (chain, now)
+        return chain
+
+    def _load(self, namespace, langtags, generation):
+        """Load messages of langtags and namespace with a single query.
+
+        Return a {langtag: messages} dict, kept only if namespace generation
+        did not change meanwhile.
+
+        """
+        from .models import Translation
+
+        messages = {langtag: {} for langtag in langtags}
+        for langtag, key_text, is_largue, small, largue in (
+                Translation.objects.filter(
+                    bcp47__langtag__in=langtags,
+                    key__namespace_id=get_namespace_id(namespace),
+                ).values_list('bcp47__langtag', 'key__text', 'is_largue',
+                              'small', 'largue').iterator()):
+            text = largue if is_largue else small
+            # blank translations fall back, as in trees
+            if text and text.strip():
+                messages[langtag][key_text] = text
+
+        with self._lock:
+            if self._generations.get(namespace, (None, ))[0] == generation:
+                for langtag, langtag_messages in messages.items():
+                    self._messages[(langtag, namespace)] = langtag_messages
+        return messages
+
+
+catalog = Catalog()
+
+
+def gettext(namespace, key, langtag=None, default=None):
+    """Return translation of a key from the in-process catalog.
+
+    langtag fallback chain is followed (es-AR -> es -> default langtag), key
+    itself is returned if there is no translation and default is None.
+
+    """
+    text = catalog.get(namespace, key, langtag)
+    if text is not None:
+        return text
+    if default is None:
+        return key
+    return default
@@ -1,14 +1,104 @@
 # -*- coding: utf-8 -*-
+from django.http import HttpResponse
+from django.utils.cache import (get_conditional_response, patch_vary_headers,
+                                quote_etag)
 from django.utils.translation import ugettext_lazy as _
 from rest_framework import generics
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.exceptions import ValidationError
+from .cache import merge_entries
 from .models import Translation, BCP47, best_langtag_list
+from .revisions import translation_delta
 from .serializers import (TranslationSerializer, BCP47Serializer)
 
 
+# preferred first
+BUNDLE_ENCODINGS = ('br', 'gzip')
+
+
+def accepted_encodings(request):
+    """Return content codings of Accept-Encoding header not refused (q=0)."""
+    encodings = set()
+    for item in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if coding and quality > 0:
+            encodings.add(coding.lower())
+    return encodings
+
+
+def bundle_response(request, bundle):
+    """Serve cached json bytes of a tree, 304 if client already has them.
+
+    Compressed bytes are served if the client accepts them, no compression
+    is done here.
+
+    """
+    encoded = bundle.get('encoded', {})
+    accepted = accepted_encodings(request)
+    encoding = next((encoding for encoding in BUNDLE_ENCODINGS
+                     if encoding in encoded and encoding in accepted), None)
+    if encoding is None:
+        content = bundle['json']
+        etag = quote_etag(bundle['etag'])
+    else:
+        # strong etags differ between encodings of the same content
+        content = encoded[encoding]
+        etag = quote_etag(f"{bundle['etag']}-{encoding}")
+
+    response = HttpResponse(content, content_type='application/json')
+    response['ETag'] = etag
+    if encoding is not None:
+        response['Content-Encoding'] = encoding
+    if encoded:
+        patch_vary_headers(response, ('Accept-Encoding', ))
+    return get_conditional_response(request, etag=etag, response=response)
+
+
+def query_param_list(request, name):
+    """Return values of a repeated or comma separated query param."""
+    values = []
+    for value in request.query_params.getlist(name):
+        values.extend(item for item in value.split(',') if item)
+    return values
+
+
+def wants_fallback(request):
+    """Return True if translations of fallback langtags were requested."""
+    return request.query_params.get('fallback', '').lower() in ('1', 'true')
+
+
+def batch_pairs(request):
+    """Return (langtag, namespace) pairs requested by a batch endpoint."""
+    langtags = query_param_list(request, 'bcp47__langtag')
+    namespaces = query_param_list(request, 'key__namespace__text')
+    if not langtags:
+        raise ValidationError(
+            {
+                'bcp47__lang': _('This field is required.')
+            },
+            code='required',
+        )
+    if not namespaces:
+        raise ValidationError(
+            {
+                'key__namespace__text': _('This field is required.')
+            },
+            code='required',
+        )
+    return [(langtag, namespace) for langtag in langtags
+            for namespace in namespaces]
+
+
 class PublicTranslationList(generics.ListAPIView):
     """Public endpoint to list translations"""
     queryset = Translation.objects.filter(
@@ -58,6 +148,9 @@ class PublicTranslationRawList(generics.ListAPIView):
         }
     }
 
+    With fallback=1 param, missing keys are taken from langtag fallback
+    chain (es-AR -> es -> default langtag).
+
     Note: ignore swagger model and result reference, it lies :)
 
     """
@@ -90,8 +183,12 @@ class PublicTranslationRawList(generics.ListAPIView):
                 },
                 code='required',
             )
-        data = Translation.get_cached_public_translations(langtag, namespace)
-        return Response(data)
+        if wants_fallback(request):
+            bundle = Translation.get_cached_public_fallback_bundle(
+                langtag, namespace)
+        else:
+            bundle = Translation.get_cached_public_bundle(langtag, namespace)
+        return bundle_response(request, bundle)
 
     def get_queryset(self):
         return Translation.objects.all()
@@ -110,6 +207,9 @@ class PrivateTranslationRawList(generics.ListAPIView):
         }
     }
 
+    With fallback=1 param, missing keys are taken from langtag fallback
+    chain (es-AR -> es -> default langtag).
+
     Note: ignore swagger model and result reference, it lies :)
 
     """
@@ -142,13 +242,202 @@ class PrivateTranslationRawList(generics.ListAPIView):
                 },
                 code='required',
             )
-        data = Translation.get_cached_private_translations(langtag, namespace)
-        return Response(data)
+        if wants_fallback(request):
+            bundle = Translation.get_cached_private_fallback_bundle(
+                langtag, namespace)
+        else:
+            bundle = Translation.get_cached_private_bundle(langtag, namespace)
+        return bundle_response(request, bundle)
+
+    def get_queryset(self):
+        return Translation.objects.all()
+
+
+class PublicTranslationRawBatchList(generics.ListAPIView):
+    """Public endpoint to list translations of many langtags and namespaces
+    in a plain way.
+
+    Accept many bcp47__langtag and key__namespace__text params, repeated or
+    comma separated, and return a big json:
+    {
+        'langtag': {
+            'namespace': {
+                'key': 'translation',
+                'key2': 'translation2'
+            },
+            'namespace2': {
+                'key': 'translation'
+            }
+        },
+        'langtag2': {
+            'namespace': {
+                'key': 'translation',
+                'key2': 'translation2'
+            },
+            'namespace2': {
+                'key': 'translation'
+            }
+        }
+    }
+
+    With fallback=1 param, missing keys are taken from langtag fallback
+    chain (es-AR -> es -> default langtag).
+
+    Note: ignore swagger model and result reference, it lies :)
+
+    """
+    serializer_class = TranslationSerializer
+    http_method_names = [u'get']
+    pagination_class = None
+    paginate_by = None
+    filterset_fields = (
+        'bcp47__langtag',
+        'key__namespace__text',
+    )
+    permission_classes = (AllowAny, )
+
+    def list(self, request, *args, **kwargs):
+        pairs = batch_pairs(request)
+        if wants_fallback(request):
+            bundles = {
+                pair: Translation.get_cached_public_fallback_bundle(*pair)
+                for pair in pairs
+            }
+        else:
+            bundles = Translation.get_cached_public_bundles(pairs)
+        return bundle_response(request, merge_entries(bundles))
+
+    def get_queryset(self):
+        return Translation.objects.all()
+
+
+class PrivateTranslationRawBatchList(generics.ListAPIView):
+    """Private endpoint to list translations of many langtags and namespaces
+    in a plain way.
+
+    Accept many bcp47__langtag and key__namespace__text params, repeated or
+    comma separated, and return a big json:
+    {
+        'langtag': {
+            'namespace': {
+                'key': 'translation',
+                'key2': 'translation2'
+            },
+            'namespace2': {
+                'key': 'translation'
+            }
+        }
+    }
+
+    With fallback=1 param, missing keys are taken from langtag fallback
+    chain (es-AR -> es -> default langtag).
+
+    Note: ignore swagger model and result reference, it lies :)
+
+    """
+    serializer_class = TranslationSerializer
+    http_method_names = [u'get']
+    pagination_class = None
+    paginate_by = None
+    filterset_fields = (
+        'bcp47__langtag',
+        'key__namespace__text',
+    )
+    permission_classes = (AllowAny, )
+
+    def list(self, request, *args, **kwargs):
+        pairs = batch_pairs(request)
+        if wants_fallback(request):
+            bundles = {
+                pair: Translation.get_cached_private_fallback_bundle(*pair)
+                for pair in pairs
+            }
+        else:
+            bundles = Translation.get_cached_private_bundles(pairs)
+        return bundle_response(request, merge_entries(bundles))
+
+    def get_queryset(self):
+        return Translation.objects.all()
+
+
+class PublicTranslationRawDeltaList(generics.ListAPIView):
+    """Public endpoint to list translations changed since a revision.
+
+    Return changed and removed key paths of a langtag and namespace:
+    {
+        'langtag': 'langtag',
+        'namespace': 'namespace',
+        'since': 12,
+        'revision': 14,
+        'reset': false,
+        'changed': {
+            'key.path': 'translation'
+        },
+        'removed': ['key.path2']
+    }
+
+    Send revision back as since param to get next changes. When reset is
+    true (since is 0 or unknown) changed has every translation and local
+    ones should be dropped.
+
+    Note: ignore swagger model and result reference, it lies :)
+
+    """
+    serializer_class = TranslationSerializer
+    http_method_names = [u'get']
+    pagination_class = None
+    paginate_by = None
+    filterset_fields = (
+        'bcp47__langtag',
+        'key__namespace__text',
+    )
+    permission_classes = (AllowAny, )
+    public = True
+
+    def list(self, request, *args, **kwargs):
+        langtag = request.query_params.get('bcp47__langtag')
+        namespace = request.query_params.get('key__namespace__text')
+        if langtag is None:
+            raise ValidationError(
+                {
+                    'bcp47__lang': _('This field is required.')
+                },
+                code='required',
+            )
+        if namespace is None:
+            raise ValidationError(
+                {
+                    'key__namespace__text': _('This field is required.')
+                },
+                code='required',
+            )
+        try:
+            since = int(request.query_params.get('since', 0))
+        except ValueError:
+            raise ValidationError(
+                {
+                    'since': _('A valid integer is required.')
+                },
+                code='invalid',
+            )
+        return Response(
+            translation_delta(langtag, namespace, since, self.public))
 
     def get_queryset(self):
         return Translation.objects.all()
 
 
+class PrivateTranslationRawDeltaList(PublicTranslationRawDeltaList):
+    """Private endpoint to list translations changed since a revision.
+
+    Same response as public one, including private translations.
+
+    Note: ignore swagger model and result reference, it lies :)
+
+    """
+    public = False
+
+
 class PublicTranslationRetrieve(generics.RetrieveAPIView):
     """Public endpoint to retrieve single translation"""
     queryset = Translation.objects.filter(
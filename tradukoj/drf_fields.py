@@ -1,13 +1,58 @@
+from django.db.models import Prefetch, prefetch_related_objects
 from rest_framework.fields import Field, empty
-from rest_framework.exceptions import NotFound
-from tradukoj.models import TranslationKey
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.serializers import ListSerializer
+from tradukoj.models import Translation, TranslationKey
 from tradukoj.serializers import TranslationKeyWithTranslationsSerializer
 
 
+def tradukoj_prefetch(*lookups):
+    """Return Prefetch objects loading translation keys at lookups and their
+    translations, to use with queryset.prefetch_related().
+
+        Product.objects.prefetch_related(*tradukoj_prefetch('name', 'desc'))
+
+    """
+    return [
+        Prefetch(
+            f'{lookup}__translations',
+            queryset=Translation.objects.select_related('bcp47'))
+        for lookup in lookups
+    ]
+
+
 class TradukojKeyTextField(Field):
+    def __init__(self, *args, **kwargs):
+        # look up keys of a namespace only
+        self.namespace = kwargs.pop('namespace', None)
+        # {text: key} loaded by TradukojListSerializer
+        self.resolved_keys = None
+        super().__init__(*args, **kwargs)
+
+    def get_queryset(self):
+        queryset = TranslationKey.objects.all()
+        if self.namespace is not None:
+            queryset = queryset.filter(namespace__text=self.namespace)
+        return queryset
+
+    def resolve_keys(self, texts):
+        """Load keys of texts with a single query, used by following
+        to_internal_value calls."""
+        self.resolved_keys = {
+            key.text: key
+            for key in self.get_queryset().filter(text__in=set(texts))
+        }
+
     def to_internal_value(self, data):
+        if self.resolved_keys is not None:
+            if data not in self.resolved_keys:
+                # a list serializer collects errors of every item
+                raise ValidationError(
+                    f"key text {data} for {self.field_name} not found")
+            return self.resolved_keys[data]
+
         try:
-            key = TranslationKey.objects.get(text=data)
+            key = self.get_queryset().get(text=data)
         except TranslationKey.DoesNotExist:
             raise NotFound(f"key text for {self.field_name} not found")
 
@@ -33,10 +78,16 @@ class TradukojSerializedField(TranslationKeyWithTranslationsSerializer):
         if not instance:
             return {}
 
+        translations = instance.translations.all()
+        # select_related would skip prefetched translations
+        if 'translations' not in getattr(instance, '_prefetched_objects_cache',
+                                         {}):
+            translations = translations.select_related('bcp47')
+
         representation = {'text': instance.text, 'translations': {}}
         if self.fallback_langtag:
             representation['fallback'] = None
-        for translation in instance.translations.select_related('bcp47').all():
+        for translation in translations:
             representation['translations'][
                 translation.bcp47.langtag] = translation.str_translation()
             if (self.fallback_langtag
@@ -44,3 +95,49 @@ class TradukojSerializedField(TranslationKeyWithTranslationsSerializer):
                 representation['fallback'] = translation.str_translation()
 
         return representation
+
+
+class TradukojListSerializer(ListSerializer):
+    """List serializer loading keys and translations of every
+    TradukojSerializedField of its child with two queries per field, and keys
+    of every TradukojKeyTextField with a query per field.
+
+    Missing keys are reported as validation errors of their items.
+
+        class MySerializer(serializers.ModelSerializer):
+            name = TradukojSerializedField(read_only=True)
+
+            class Meta:
+                model = MyModel
+                list_serializer_class = TradukojListSerializer
+
+    """
+
+    def to_representation(self, data):
+        instances = list(data.all() if hasattr(data, 'all') else data)
+        lookups = [
+            '__'.join(field.source_attrs)
+            for field in self.child.fields.values()
+            if isinstance(field, TradukojSerializedField)
+            and field.source != '*'
+        ]
+        if instances and lookups:
+            prefetch_related_objects(instances, *tradukoj_prefetch(*lookups))
+        return super().to_representation(instances)
+
+    def to_internal_value(self, data):
+        fields = [
+            field for field in self.child.fields.values()
+            if isinstance(field, TradukojKeyTextField) and not field.read_only
+        ]
+        if isinstance(data, list):
+            items = [item for item in data if isinstance(item, dict)]
+            for field in fields:
+                texts = [item.get(field.field_name) for item in items]
+                field.resolve_keys(
+                    text for text in texts if isinstance(text, str))
+        try:
+            return super().to_internal_value(data)
+        finally:
+            for field in fields:
+                field.resolved_keys = None
@@ -0,0 +1,206 @@
+"""
+Background execution of GetTextFile imports.
+
+Uploaded files are queued (see signals.py) and processed by the backend set
+in TRADUKOJ_IMPORT_BACKEND setting:
+
+    tradukoj.executors.ThreadImportBackend (default): a thread pool of
+        TRADUKOJ_IMPORT_WORKERS (default 2) threads in current process.
+    tradukoj.executors.DatabaseImportBackend: files stay queued into db
+        until a `process_tradukoj_imports` worker picks them.
+    tradukoj.executors.SyncImportBackend: process files on upload request,
+        the old behaviour.
+
+Imports of the same namespace and langtag never run at the same time: a file
+is skipped while other one of its namespace/langtag is running, and the
+running worker processes it once done.
+
+Files running for more than TRADUKOJ_IMPORT_CLAIM_TIMEOUT seconds (default
+3600) are considered abandoned, as when their process died, and are queued
+again. Set it above the time of the longest import.
+
+Queued files left by a restart are enqueued again by the thread backend on
+the first request of the process, and picked by `process_tradukoj_imports`
+for any backend.
+
+"""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+_backend = None
+
+
+def get_claim_timeout():
+    return getattr(settings, 'TRADUKOJ_IMPORT_CLAIM_TIMEOUT', 3600)
+
+
+def stale_claim_date():
+    """Return the date files running since before are abandoned."""
+    return timezone.now() - timedelta(seconds=get_claim_timeout())
+
+
+def running_filter():
+    """Return a Q of files being imported, abandoned ones excluded."""
+    return Q(started_date__gte=stale_claim_date(), finished_date__isnull=True)
+
+
+def queued_filter():
+    """Return a Q of files waiting to be imported, abandoned ones
+    included."""
+    return Q(started_date__isnull=True) | Q(
+        started_date__lt=stale_claim_date(), finished_date__isnull=True)
+
+
+def claim_gettext_file(gettext_file_id):
+    """Mark a queued file as running and return it.
+
+    Return None if the file is not queued or other file of the same
+    namespace and langtag is running.
+
+    """
+    from .models import GetTextFile, Namespace
+
+    with transaction.atomic():
+        gettext_file = GetTextFile.objects.select_for_update().filter(
+            queued_filter(), pk=gettext_file_id).first()
+        if gettext_file is None:
+            return None
+
+        # serialize claims of the same namespace
+        Namespace.objects.select_for_update().filter(
+            pk=gettext_file.namespace_id).first()
+        running = GetTextFile.objects.filter(
+            running_filter(),
+            namespace_id=gettext_file.namespace_id,
+            bcp47_id=gettext_file.bcp47_id,
+        ).exists()
+        if running:
+            return None
+
+        if gettext_file.started_date is not None:
+            logger.warning('Claiming abandoned import of %s', gettext_file)
+        gettext_file.started_date = timezone.now()
+        GetTextFile.objects.filter(pk=gettext_file.pk).update(
+            started_date=gettext_file.started_date)
+    return gettext_file
+
+
+def queued_gettext_files():
+    """Return ids of queued files, older first."""
+    from .models import GetTextFile
+
+    return list(
+        GetTextFile.objects.filter(queued_filter()).order_by(
+            'pk').values_list('pk', flat=True))
+
+
+def next_queued_gettext_file(namespace_id, bcp47_id):
+    from .models import GetTextFile
+
+    return GetTextFile.objects.filter(
+        queued_filter(),
+        namespace_id=namespace_id,
+        bcp47_id=bcp47_id,
+    ).order_by('pk').values_list('pk', flat=True).first()
+
+
+def run_import(gettext_file_id):
+    """Process a queued file, and then the queued ones of its namespace/langtag."""
+    from .models import GetTextFile
+
+    while gettext_file_id is not None:
+        gettext_file = claim_gettext_file(gettext_file_id)
+        if gettext_file is None:
+            return
+
+        done_with_errors = False
+        try:
+            gettext_file.process_file()
+        except Exception as error:  # pylint: disable=broad-except
+            logger.exception('Error importing %s', gettext_file)
+            done_with_errors = True
+            gettext_file.log = f"Error: {error}"
+
+        finished_date = timezone.now()
+        elapsed = (finished_date - gettext_file.started_date).total_seconds()
+        # unless the file has been claimed again meanwhile
+        GetTextFile.objects.filter(
+            pk=gettext_file.pk, started_date=gettext_file.started_date).update(
+                done=not done_with_errors,
+                done_with_errors=done_with_errors,
+                finished_date=finished_date,
+                log=f"{gettext_file.log}\nFinished in {elapsed:.2f}s",
+            )
+        gettext_file_id = next_queued_gettext_file(gettext_file.namespace_id,
+                                                   gettext_file.bcp47_id)
+
+
+class BaseImportBackend:
+    def enqueue(self, gettext_file_id):
+        raise NotImplementedError
+
+    def resume(self):
+        """Process files queued before the process started."""
+
+
+class SyncImportBackend(BaseImportBackend):
+    def enqueue(self, gettext_file_id):
+        run_import(gettext_file_id)
+
+
+class ThreadImportBackend(BaseImportBackend):
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, 'TRADUKOJ_IMPORT_WORKERS', 2),
+            thread_name_prefix='tradukoj-import',
+        )
+
+    def enqueue(self, gettext_file_id):
+        self.executor.submit(self.run, gettext_file_id)
+
+    def resume(self):
+        for gettext_file_id in queued_gettext_files():
+            self.enqueue(gettext_file_id)
+
+    @staticmethod
+    def run(gettext_file_id):
+        close_old_connections()
+        try:
+            run_import(gettext_file_id)
+        except Exception:  # pylint: disable=broad-except
+            logger.exception('Error importing gettext file %s', gettext_file_id)
+        finally:
+            close_old_connections()
+
+
+class DatabaseImportBackend(BaseImportBackend):
+    def enqueue(self, gettext_file_id):
+        # queued into db, process_tradukoj_imports command will pick it
+        pass
+
+
+def get_import_backend():
+    global _backend  # pylint: disable=global-statement
+    if _backend is None:
+        _backend = import_string(
+            getattr(settings, 'TRADUKOJ_IMPORT_BACKEND',
+                    'tradukoj.executors.ThreadImportBackend'))()
+    return _backend
+
+
+def resume_imports(**_kwargs):
+    """Resume queued imports on the first request of the process."""
+    request_started.disconnect(dispatch_uid='tradukoj_resume_imports')
+    try:
+        get_import_backend().resume()
+    except Exception:  # pylint: disable=broad-except
+        logger.exception('Error resuming gettext file imports')
@@ -1,12 +1,42 @@
 # pylint: disable=W0212
+import threading
 import uuid
-from django.db import models
+from contextlib import contextmanager
+from django.db import models, transaction
 from django.db.models.fields.related_descriptors import (
     ForwardOneToOneDescriptor,
     ReverseOneToOneDescriptor,
 )
 from django.db.models.fields.reverse_related import OneToOneRel
 from django.utils.translation import gettext_lazy as _
+from .bulk import BATCH_SIZE, bulk_create_keys
+
+_deferred = threading.local()
+
+
+@contextmanager
+def defer_key_saves():
+    """Do not save keys set to OneToOneTradukojField inside the block.
+
+    Keys get their generated text, and are inserted in batches by
+    `TradukojQuerySet.bulk_create`:
+
+        with defer_key_saves():
+            products = [
+                Product(name=TranslationKey(
+                    init_namespace='shop',
+                    init_translations={'es': 'Mesa', 'en': 'Table'}))
+                for _ in range(1000)
+            ]
+        Product.objects.bulk_create(products)
+
+    """
+    previous = getattr(_deferred, 'active', False)
+    _deferred.active = True
+    try:
+        yield
+    finally:
+        _deferred.active = previous
 
 
 class TradukojForwardOneToOneDescriptor(ForwardOneToOneDescriptor):
@@ -23,11 +53,11 @@ class TradukojForwardOneToOneDescriptor(ForwardOneToOneDescriptor):
         # if related_object:
         #     related_object.delete()
 
-        if not value.text and value.auto_key_text is not None:
-            value.text = (
-                f"{instance._meta.app_label}_{instance._meta.model_name}_{self.field.name}_{uuid.uuid4().hex}"
-            )
-            value.save()
+        if (value is not None and not value.text
+                and value.auto_key_text is not None):
+            value.text = self.field.generate_key_text(instance)
+            if not getattr(_deferred, 'active', False):
+                value.save()
 
         return super().__set__(instance, value)
 
@@ -55,6 +85,10 @@ class OneToOneTradukojField(models.ForeignKey):
         to = "tradukoj.TranslationKey"
         super().__init__(to, on_delete, to_field=None, **kwargs)
 
+    def generate_key_text(self, instance):
+        return (f"{instance._meta.app_label}_{instance._meta.model_name}_"
+                f"{self.name}_{uuid.uuid4().hex}")
+
     def deconstruct(self):
         name, path, args, kwargs = super().deconstruct()
         if "unique" in kwargs:
@@ -76,3 +110,37 @@ class OneToOneTradukojField(models.ForeignKey):
     def _check_unique(self, **kwargs):
         # Override ForeignKey since check isn't applicable here.
         return []
+
+
+class TradukojQuerySet(models.QuerySet):
+    """QuerySet whose bulk_create inserts unsaved keys of
+    OneToOneTradukojField, and their init_translations, in batches before
+    the objects."""
+
+    def bulk_create(self, objs, batch_size=None, **kwargs):
+        objs = list(objs)
+        fields = [
+            field for field in self.model._meta.concrete_fields
+            if isinstance(field, OneToOneTradukojField)
+        ]
+        pending = []
+        for obj in objs:
+            for field in fields:
+                key = field.get_cached_value(obj, default=None)
+                if key is None or key.pk is not None:
+                    continue
+                if not key.text and key.auto_key_text is not None:
+                    key.text = field.generate_key_text(obj)
+                pending.append((obj, field, key))
+        if not pending:
+            return super().bulk_create(objs, batch_size=batch_size, **kwargs)
+
+        with transaction.atomic(using=self.db, savepoint=False):
+            bulk_create_keys([key for _obj, _field, key in pending], self.db,
+                             batch_size or BATCH_SIZE)
+            for obj, field, key in pending:
+                setattr(obj, field.name, key)
+            return super().bulk_create(objs, batch_size=batch_size, **kwargs)
+
+
+TradukojManager = models.Manager.from_queryset(TradukojQuerySet)
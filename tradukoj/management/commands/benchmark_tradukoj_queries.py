@@ -0,0 +1,219 @@
+import json
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from tradukoj.bulk import BATCH_SIZE, chunks
+from tradukoj.models import BCP47, Namespace, Translation, TranslationKey
+
+NAMESPACE_PREFIX = 'tradukoj_benchmark_'
+LANGTAG_PREFIX = 'x-benchmark'
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    # pylint: disable=C0301
+    help = 'Capture EXPLAIN plans and timings of tradukoj lookup queries on generated translations'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            dest='sizes',
+            type=int,
+            nargs='+',
+            default=[10000, 100000, 1000000],
+            help='number of generated translations of each run',
+        )
+
+        parser.add_argument(
+            '--namespaces',
+            dest='namespaces',
+            type=int,
+            default=10,
+            help='generated namespaces',
+        )
+
+        parser.add_argument(
+            '--langtags',
+            dest='langtags',
+            type=int,
+            default=10,
+            help='generated langtags',
+        )
+
+        parser.add_argument(
+            '--repeat',
+            dest='repeat',
+            type=int,
+            default=5,
+            help='timed runs of each query',
+        )
+
+        parser.add_argument(
+            '--analyze',
+            dest='analyze',
+            required=False,
+            help='EXPLAIN ANALYZE on PostgreSQL',
+            action="store_true",
+        )
+
+        parser.add_argument(
+            '--output',
+            dest='output',
+            default=None,
+            help='write results as JSON into this file',
+        )
+
+        parser.add_argument(
+            '--database',
+            dest='database',
+            default='default',
+            help='database alias',
+        )
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        self.using = options['database']
+        self.vendor = connections[self.using].vendor
+        results = []
+        for size in options['sizes']:
+            self.stdout.write(f"{self.vendor}: {size} translations")
+            # generated rows never outlive the run
+            try:
+                with transaction.atomic(using=self.using):
+                    self.generate(size, options['namespaces'],
+                                  options['langtags'])
+                    results.append({
+                        'vendor': self.vendor,
+                        'size': size,
+                        'queries': self.run_queries(options['repeat'],
+                                                    options['analyze']),
+                    })
+                    raise Rollback()
+            except Rollback:
+                pass
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(results, output, indent=2)
+        self.stdout.write(self.style.SUCCESS('DONE'))
+
+    def generate(self, size, namespaces, langtags):
+        """Insert size translations spread over namespaces and langtags, with
+        a quarter of private keys."""
+        start = time.monotonic()
+        keys_per_namespace = max(size // (namespaces * langtags), 1)
+        namespace_ids = [
+            Namespace.objects.using(self.using).create(
+                text=f"{NAMESPACE_PREFIX}{i}").pk for i in range(namespaces)
+        ]
+        bcp47_ids = [
+            BCP47.objects.using(self.using).create(
+                langtag=f"{LANGTAG_PREFIX}{i}", enabled=True).pk
+            for i in range(langtags)
+        ]
+        TranslationKey.objects.using(self.using).bulk_create(
+            [
+                TranslationKey(
+                    namespace_id=namespace_id,
+                    text=f"section{i % 100}.key{i}",
+                    public=i % 4 != 0)
+                for namespace_id in namespace_ids
+                for i in range(keys_per_namespace)
+            ],
+            batch_size=BATCH_SIZE,
+        )
+        key_ids = TranslationKey.objects.using(self.using).filter(
+            namespace_id__in=namespace_ids).values_list('id', flat=True)
+        for chunk in chunks(key_ids.iterator(), BATCH_SIZE):
+            Translation.objects.using(self.using).bulk_create(
+                [
+                    Translation(
+                        key_id=key_id,
+                        bcp47_id=bcp47_id,
+                        small=f"text {key_id} {bcp47_id}")
+                    for key_id in chunk for bcp47_id in bcp47_ids
+                ],
+                batch_size=BATCH_SIZE,
+            )
+
+        with connections[self.using].cursor() as cursor:
+            # planner statistics of generated rows
+            cursor.execute('ANALYZE')
+        self.stdout.write(
+            f"  generated in {time.monotonic() - start:.2f}s")
+
+    def queries(self):
+        """Return (name, queryset) of the lookups done by trees, endpoints and
+        TradukojKeyTextField."""
+        langtag = f"{LANGTAG_PREFIX}0"
+        namespace = f"{NAMESPACE_PREFIX}0"
+        namespace_id = Namespace.objects.using(
+            self.using).get(text=namespace).pk
+        key_text = TranslationKey.objects.using(self.using).filter(
+            namespace_id=namespace_id,
+            public=True).values_list('text', flat=True).first()
+        translations = Translation.objects.using(self.using)
+        trees = {
+            public: Translation.tree_rows_queryset(
+                Translation.tree_queryset([namespace_id], [langtag],
+                                          public).using(self.using),
+                'key__namespace_id')
+            for public in (True, False)
+        }
+        return [
+            ('langtag',
+             BCP47.objects.using(self.using).filter(
+                 langtag=langtag, enabled=True)),
+            ('public_tree', trees[True]),
+            ('private_tree', trees[False]),
+            ('public_list',
+             translations.filter(
+                 key__public=True,
+                 bcp47__enabled=True,
+                 bcp47__langtag=langtag,
+                 key__namespace__text=namespace)),
+            ('public_retrieve',
+             translations.filter(
+                 key__public=True,
+                 bcp47__enabled=True,
+                 bcp47__langtag=langtag,
+                 key__namespace__text=namespace,
+                 key__text=key_text)),
+            ('key_text',
+             TranslationKey.objects.using(self.using).filter(
+                 text__in=[key_text])),
+        ]
+
+    def run_queries(self, repeat, analyze):
+        results = {}
+        for name, queryset in self.queries():
+            explain_options = {}
+            if analyze and self.vendor == 'postgresql':
+                explain_options = {'analyze': True, 'buffers': True}
+            plan = queryset.explain(**explain_options)
+
+            # first run warms db caches
+            rows = len(list(queryset))
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                list(queryset.all())
+                timings.append((time.perf_counter() - start) * 1000)
+
+            results[name] = {
+                'rows': rows,
+                'min_ms': min(timings),
+                'median_ms': statistics.median(timings),
+                'plan': plan,
+            }
+            self.stdout.write(
+                f"  {name}: {rows} rows, min {min(timings):.2f}ms, "
+                f"median {statistics.median(timings):.2f}ms")
+            if self.verbosity >= 2:
+                for line in plan.splitlines():
+                    self.stdout.write(f"    {line}")
+        return results
@@ -1,6 +1,9 @@
 import polib
 from django.core.management.base import BaseCommand
+from django.db import router, transaction
+from tradukoj.bulk import BATCH_SIZE
 from tradukoj.models import TranslationKey
+from tradukoj.namespaces import get_namespace_id
 
 
 class Command(BaseCommand):
@@ -35,17 +38,28 @@ class Command(BaseCommand):
 
     def handle(self, *args, **options):
         po_file = polib.pofile(options['pofile'])
+        namespace = options['namespace']
         safe_advisory = ""
 
         if options["safe"]:
             safe_advisory = "(Not really because --safe arg)"
 
-        for translationkey in TranslationKey.objects.filter(
-                namespace__text=options['namespace']):
-            if not po_file.find(translationkey.text):
-                self.stdout.write(
-                    f"Delete {safe_advisory} {translationkey.text}")
-                if not options["safe"]:
-                    translationkey.delete()
+        # polib's find() ignores obsolete entries too
+        msgids = {entry.msgid for entry in po_file if not entry.obsolete}
+        orphan_ids = []
+        namespace_id = get_namespace_id(namespace)
+        for key_id, key_text in TranslationKey.objects.filter(
+                namespace_id=namespace_id).values_list('id', 'text'):
+            if key_text not in msgids:
+                self.stdout.write(f"Delete {safe_advisory} {key_text}")
+                orphan_ids.append(key_id)
+
+        if not options["safe"] and orphan_ids:
+            using = router.db_for_write(TranslationKey)
+            # key deletes write tombstones and patch trees once on commit
+            with transaction.atomic(using=using):
+                for i in range(0, len(orphan_ids), BATCH_SIZE):
+                    TranslationKey.objects.using(using).filter(
+                        pk__in=orphan_ids[i:i + BATCH_SIZE]).delete()
 
         self.stdout.write(self.style.SUCCESS('DONE'))
@@ -0,0 +1,174 @@
+import hashlib
+import json
+import os
+import time
+from tempfile import NamedTemporaryFile
+from urllib.parse import quote
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+from tradukoj.cache import render_tree
+from tradukoj.models import (Namespace, Translation, TranslationTombstone,
+                             enabled_langtags)
+
+MANIFEST = 'manifest.json'
+# pairs built by each query
+CHUNK_SIZE = 50
+
+
+def write_atomic(path, content):
+    """Write content into path through a temp file rename, so readers never
+    see a half-written file."""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    with NamedTemporaryFile(dir=directory, prefix='.', delete=False) as tmp:
+        try:
+            tmp.write(content)
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        except BaseException:
+            os.remove(tmp.name)
+            raise
+    os.chmod(tmp.name, 0o644)
+    os.replace(tmp.name, path)
+
+
+class Command(BaseCommand):
+    # pylint: disable=C0301
+    help = 'Export JSON trees of every enabled langtag and namespace as static files'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output',
+            dest='output',
+            required=True,
+            help='output directory',
+        )
+
+        parser.add_argument(
+            '--private',
+            dest='private',
+            required=False,
+            help='Export private trees too',
+            action="store_true",
+        )
+
+        parser.add_argument(
+            '--force',
+            dest='force',
+            required=False,
+            help='Render every tree, even unchanged ones',
+            action="store_true",
+        )
+
+    def handle(self, *args, **options):
+        output = options['output']
+        start = time.monotonic()
+        manifest = self.load_manifest(output)
+        # read before trees, changes written meanwhile are exported next time
+        revisions = self.get_revisions()
+        namespaces = list(
+            Namespace.objects.order_by('text').values_list('text', flat=True))
+        visibilities = [True]
+        if options['private']:
+            visibilities.append(False)
+
+        bundles = {}
+        pending = {}
+        for public in visibilities:
+            for langtag in enabled_langtags():
+                for namespace in namespaces:
+                    path = self.bundle_path(langtag, namespace, public)
+                    revision = revisions.get((langtag, namespace), 0)
+                    previous = manifest.get(path)
+                    if (not options['force'] and previous
+                            and previous['revision'] == revision
+                            and os.path.exists(os.path.join(output, path))):
+                        bundles[path] = previous
+                        continue
+                    bundles[path] = {
+                        'langtag': langtag,
+                        'namespace': namespace,
+                        'public': public,
+                        'revision': revision,
+                    }
+                    pending.setdefault(public, []).append((langtag, namespace))
+
+        written = 0
+        for public, pairs in pending.items():
+            for i in range(0, len(pairs), CHUNK_SIZE):
+                chunk = pairs[i:i + CHUNK_SIZE]
+                trees = Translation.build_langtag_trees(chunk, public)
+                for langtag, namespace in chunk:
+                    path = self.bundle_path(langtag, namespace, public)
+                    content = render_tree(trees[(langtag, namespace)])
+                    bundles[path]['sha1'] = hashlib.sha1(content).hexdigest()
+                    bundles[path]['size'] = len(content)
+                    previous = manifest.get(path)
+                    if (previous and previous.get('sha1') ==
+                            bundles[path]['sha1']
+                            and os.path.exists(os.path.join(output, path))):
+                        continue
+                    write_atomic(os.path.join(output, path), content)
+                    written += 1
+                    if options['verbosity'] > 1:
+                        self.stdout.write(f"Write {path}")
+
+        removed = 0
+        for path in set(manifest) - set(bundles):
+            if manifest[path]['public'] not in visibilities:
+                # not exported by this run, as private trees without --private
+                bundles[path] = manifest[path]
+                continue
+            # langtag disabled or namespace removed
+            if os.path.exists(os.path.join(output, path)):
+                os.remove(os.path.join(output, path))
+            removed += 1
+
+        write_atomic(
+            os.path.join(output, MANIFEST),
+            json.dumps({
+                'bundles': bundles
+            }, ensure_ascii=False, indent=2, sort_keys=True).encode('utf-8'),
+        )
+
+        rendered = sum(len(pairs) for pairs in pending.values())
+        self.stdout.write(
+            f"{len(bundles)} bundles: {rendered} rendered, {written} written, "
+            f"{removed} removed in {time.monotonic() - start:.2f}s")
+        self.stdout.write(self.style.SUCCESS('DONE'))
+
+    @staticmethod
+    def bundle_path(langtag, namespace, public):
+        visibility = 'public' if public else 'private'
+        return '/'.join(
+            (visibility, quote(langtag, safe=''),
+             quote(namespace, safe='') + '.json'))
+
+    @staticmethod
+    def load_manifest(output):
+        try:
+            with open(os.path.join(output, MANIFEST), encoding='utf-8') as f:
+                return json.load(f)['bundles']
+        except (OSError, ValueError, KeyError):
+            return {}
+
+    @staticmethod
+    def get_revisions():
+        """Return {(langtag, namespace): revision} of last change of their
+        translations, deletions included."""
+        revisions = {}
+        translations = Translation.objects.filter(
+            bcp47__enabled=True).order_by().values(
+                'bcp47__langtag', 'key__namespace__text').annotate(
+                    revision=Max('revision')).values_list(
+                        'bcp47__langtag', 'key__namespace__text', 'revision')
+        tombstones = TranslationTombstone.objects.filter(
+            bcp47__enabled=True).order_by().values(
+                'bcp47__langtag', 'namespace__text').annotate(
+                    revision=Max('revision')).values_list(
+                        'bcp47__langtag', 'namespace__text', 'revision')
+        for rows in (translations, tombstones):
+            for langtag, namespace, revision in rows:
+                revisions[(langtag, namespace)] = max(
+                    revision, revisions.get((langtag, namespace), 0))
+        return revisions
@@ -1,6 +1,9 @@
+import io
 import polib
 from django.core.management.base import BaseCommand
+from tradukoj.bulk import QueryStats
 from tradukoj.models import Translation, TranslationKey
+from tradukoj.namespaces import get_namespace_id
 
 
 class Command(BaseCommand):
@@ -48,34 +51,47 @@ class Command(BaseCommand):
         po_object.metadata = {
             'Content-Type': 'text/plain; charset=utf-8',
         }
-        for translation_key in TranslationKey.objects.filter(
-                namespace__text=namespace):
 
-            translated = ""
-            try:
-                translation = Translation.objects.get(
-                    bcp47__langtag=langtag, key=translation_key)
-                translated = translation.str_translation()
-            except Translation.DoesNotExist:
-                translated = ""
+        stats = QueryStats(Translation.objects.db)
+        entries = 0
+        with stats.track():
+            namespace_id = get_namespace_id(namespace)
+            translations = self.get_translations(namespace_id, langtag)
+            reference_translations = self.get_translations(
+                namespace_id, reference_langtag)
+            translation_keys = TranslationKey.objects.filter(
+                namespace_id=namespace_id).order_by('pk').values_list(
+                    'id', 'text')
 
-            if not translation_key.text:
-                continue
+            # entries are streamed into file, as polib.POFile.save does
+            with io.open(output_file, 'w', encoding=po_object.encoding) as fhandle:
+                fhandle.write(po_object.__unicode__())
+                for key_id, key_text in translation_keys.iterator():
+                    if not key_text:
+                        continue
 
-            help_text = ""
-            try:
-                reference_translation = Translation.objects.get(
-                    bcp47__langtag=reference_langtag, key=translation_key)
-                help_text = f"i18n {reference_langtag}: {reference_translation.str_translation()}"
-            except Translation.DoesNotExist:
-                help_text = "i18n {reference_langtag}: "
+                    translated = translations.get(key_id) or ""
+                    reference = reference_translations.get(key_id) or ""
+                    help_text = f"i18n {reference_langtag}: {reference}"
+                    entry = polib.POEntry(
+                        msgid=key_text, msgstr=translated, comment=help_text)
+                    fhandle.write('\n')
+                    fhandle.write(entry.__unicode__(po_object.wrapwidth))
+                    entries += 1
 
-            if not translated:
-                translated = ""
-            entry = polib.POEntry(
-                msgid=translation_key.text,
-                msgstr=translated,
-                comment=help_text)
-            po_object.append(entry)
+        if options['verbosity'] > 1:
+            self.stdout.write(
+                f"Exported {entries} entries in {stats.seconds:.2f}s "
+                f"with {stats.queries} queries")
 
-        po_object.save(output_file)
+    @staticmethod
+    def get_translations(namespace_id, langtag):
+        """Return a {key_id: translation text} dict of a langtag."""
+        translations = {}
+        rows = Translation.objects.filter(
+            key__namespace_id=namespace_id,
+            bcp47__langtag=langtag,
+        ).values_list('key_id', 'is_largue', 'small', 'largue')
+        for key_id, is_largue, small, largue in rows.iterator():
+            translations[key_id] = largue if is_largue else small
+        return translations
@@ -0,0 +1,39 @@
+import time
+from django.core.management.base import BaseCommand
+from tradukoj.executors import queued_gettext_files, run_import
+
+
+class Command(BaseCommand):
+    # pylint: disable=C0301
+    help = 'Process queued .po files, used with tradukoj.executors.DatabaseImportBackend'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            dest='interval',
+            type=float,
+            default=5,
+            help='seconds between db polls',
+        )
+
+        parser.add_argument(
+            '--once',
+            dest='once',
+            required=False,
+            help='Process queued files and exit',
+            action="store_true",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            # files of a running namespace/langtag are left queued, their
+            # worker will process them
+            for gettext_file_id in queued_gettext_files():
+                self.stdout.write(f"Processing gettext file {gettext_file_id}")
+                run_import(gettext_file_id)
+
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS('DONE'))
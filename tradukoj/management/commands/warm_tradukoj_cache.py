@@ -0,0 +1,43 @@
+import time
+from django.core.management.base import BaseCommand
+from tradukoj.warm import STATUS_BUILT, STATUS_CURRENT, STATUS_BUSY, warm_cache
+
+
+class Command(BaseCommand):
+    # pylint: disable=C0301
+    help = 'Build cached JSON trees of every enabled langtag and namespace'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            dest='workers',
+            type=int,
+            default=None,
+            help='threads building trees, TRADUKOJ_WARM_WORKERS by default',
+        )
+
+        parser.add_argument(
+            '--force',
+            dest='force',
+            required=False,
+            help='Build every tree, even cached ones',
+            action="store_true",
+        )
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        start = time.monotonic()
+        counts = warm_cache(options['workers'], options['force'],
+                            self.report)
+        self.stdout.write(
+            f"{counts[STATUS_BUILT]} built, {counts[STATUS_CURRENT]} current, "
+            f"{counts[STATUS_BUSY]} being built by others "
+            f"in {time.monotonic() - start:.2f}s")
+        self.stdout.write(self.style.SUCCESS('DONE'))
+
+    def report(self, langtag, namespace, public, status, seconds):
+        if status == STATUS_CURRENT and self.verbosity < 2:
+            return
+        visibility = 'public' if public else 'private'
+        self.stdout.write(
+            f"{visibility} {langtag} {namespace}: {status} in {seconds:.3f}s")
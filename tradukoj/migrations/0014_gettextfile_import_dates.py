@@ -0,0 +1,32 @@
+# Generated by Django 3.2.25 on 2026-10-18 12:38
+
+from django.db import migrations, models
+
+
+def mark_files_imported(apps, schema_editor):
+    # files uploaded before were imported on upload, they are not queued
+    GetTextFile = apps.get_model('tradukoj', 'GetTextFile')
+    GetTextFile.objects.update(
+        started_date=models.F('last_updated_date'),
+        finished_date=models.F('last_updated_date'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tradukoj', '0013_auto_20190122_1653'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='gettextfile',
+            name='finished_date',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Finished date'),
+        ),
+        migrations.AddField(
+            model_name='gettextfile',
+            name='started_date',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Started date'),
+        ),
+        migrations.RunPython(mark_files_imported, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.2.25 on 2026-10-18 12:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tradukoj', '0014_gettextfile_import_dates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bcp47',
+            name='fallback',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='fallback_of', to='tradukoj.bcp47', verbose_name='Fallback lang'),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 3.2.25 on 2026-10-18 12:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tradukoj', '0015_bcp47_fallback'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TranslationTombstone',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key_text', models.CharField(max_length=255, verbose_name='text key')),
+                ('public', models.BooleanField(default=True)),
+                ('private', models.BooleanField(default=True)),
+                ('revision', models.BigIntegerField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='namespace',
+            name='revision',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='translation',
+            name='revision',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='translation',
+            index=models.Index(fields=['bcp47', 'revision'], name='tradukoj_tr_bcp47_i_2cff8d_idx'),
+        ),
+        migrations.AddField(
+            model_name='translationtombstone',
+            name='bcp47',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tombstones', to='tradukoj.bcp47'),
+        ),
+        migrations.AddField(
+            model_name='translationtombstone',
+            name='namespace',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tombstones', to='tradukoj.namespace'),
+        ),
+        migrations.AddIndex(
+            model_name='translationtombstone',
+            index=models.Index(fields=['namespace', 'bcp47', 'revision'], name='tradukoj_tr_namespa_436f00_idx'),
+        ),
+    ]
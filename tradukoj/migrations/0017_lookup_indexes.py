@@ -0,0 +1,26 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tradukoj', '0016_translation_revision'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='translationkey',
+            name='text',
+            field=models.CharField(db_index=True, max_length=255, verbose_name='text key'),
+        ),
+        migrations.AddIndex(
+            model_name='bcp47',
+            index=models.Index(fields=['langtag', 'enabled'], name='tradukoj_bc_langtag_c738be_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='translationkey',
+            index=models.Index(fields=['namespace', 'public'], name='tradukoj_tr_namespa_422c62_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tradukoj', '0017_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TranslationSnapshot',
+            fields=[
+                ('id', models.CharField(max_length=40, primary_key=True, serialize=False)),
+                ('langtag', models.CharField(max_length=255, verbose_name='IETF BCP 47 langtag')),
+                ('public', models.BooleanField(default=True)),
+                ('content', models.BinaryField()),
+                ('etag', models.CharField(max_length=40)),
+                ('revision', models.BigIntegerField()),
+                ('updated', models.DateTimeField(auto_now=True)),
+                ('namespace', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='tradukoj.namespace')),
+            ],
+        ),
+    ]
@@ -19,32 +19,175 @@ langtag       = language
 So, there is:
 language-extlang-script-region-variant-extension-privateuse
 """
+import json
+from functools import lru_cache, partial
 from tempfile import NamedTemporaryFile
-from django.db import models
-# Future use
-# from django.db import DEFAULT_DB_ALIAS, connections
+from django.conf import settings
 from django.core.cache import cache
+from django.db import models
+from django.db import connections, router, transaction
 from django.utils.translation.trans_real import parse_accept_lang_header
 import polib
 from langcodes import best_match
+from .bulk import (BATCH_SIZE, bulk_translate, import_pofile,
+                   split_translation_text)
+from .cache import (get_tree, get_trees, get_fallback_tree, rebuild_tree,
+                    patch_tree_on_commit, mark_dirty,
+                    cache_signals_suspended, suspend_cache_signals)
+from .namespaces import get_namespace_id, get_namespace_ids
+from .revisions import next_revision, stamp_revisions, tombstone_translations
+from .snapshots import delete_snapshots
+from .trees import insert_node
+
+
+ENABLED_LANGTAGS_CACHE_KEY = 'tradukoj_enabled_langtags'
+FALLBACKS_CACHE_KEY = 'tradukoj_langtag_fallbacks'
+
+
+def enabled_langtags():
+    """Return a cached tuple of enabled langtags."""
+    langtags = cache.get(ENABLED_LANGTAGS_CACHE_KEY)
+    if langtags is None:
+        langtags = tuple(
+            BCP47.objects.filter(enabled=True).order_by('pk').values_list(
+                'langtag', flat=True))
+        cache.set(ENABLED_LANGTAGS_CACHE_KEY, langtags, None)
+    return langtags
+
+
+def langtag_fallbacks():
+    """Return cached ({langtag: fallback langtag}, default langtags) of
+    enabled langs."""
+    fallbacks = cache.get(FALLBACKS_CACHE_KEY)
+    if fallbacks is None:
+        langtags = {}
+        defaults = []
+        for langtag, fallback, fallback_enabled, default in BCP47.objects.filter(
+                enabled=True).order_by('pk').values_list(
+                    'langtag', 'fallback__langtag', 'fallback__enabled',
+                    'default'):
+            langtags[langtag] = fallback if fallback_enabled else None
+            if default:
+                defaults.append(langtag)
+        fallbacks = (langtags, tuple(defaults))
+        cache.set(FALLBACKS_CACHE_KEY, fallbacks, None)
+    return fallbacks
+
+
+def _normalize_langtag(langtag):
+    return langtag.replace('_', '-').lower()
+
+
+def fallback_chain(langtag):
+    """Return langtags used to translate langtag, from most to less specific.
+
+    Chain follows `BCP47.fallback` when set, enabled langtag parents
+    otherwise (es-AR -> es), and ends with default langtags.
+
+    """
+    fallbacks, defaults = langtag_fallbacks()
+    enabled = {_normalize_langtag(enabled): enabled for enabled in fallbacks}
+
+    chain = []
+    current = enabled.get(_normalize_langtag(langtag), langtag)
+    while current is not None and current not in chain:
+        chain.append(current)
+        fallback = fallbacks.get(current)
+        if fallback is None:
+            subtags = _normalize_langtag(current).split('-')
+            while fallback is None and len(subtags) > 1:
+                subtags.pop()
+                fallback = enabled.get('-'.join(subtags))
+        current = fallback
+
+    for default in defaults:
+        if default not in chain:
+            chain.append(default)
+    return chain
+
+
+def invalidate_langtags():
+    """Drop cached enabled langtags and fallbacks."""
+    cache.delete_many([ENABLED_LANGTAGS_CACHE_KEY, FALLBACKS_CACHE_KEY])
+
+
+def delete_whole_trees(using, delete, langtags=None, namespaces=None):
+    """Run delete() of langs or namespaces and mark their trees as dirty.
+
+    Cascade deleted translations would patch trees and write tombstones one
+    by one, but those trees are dropped as a whole (and tombstones are
+    deleted too), so signals are suspended and trees are marked as dirty
+    once on commit. None langtags or namespaces means all of them.
+
+    """
+    if cache_signals_suspended():
+        # caller takes care of cache
+        return delete()
+
+    with transaction.atomic(using=using, savepoint=False):
+        with suspend_cache_signals():
+            deleted = delete()
+        transaction.on_commit(
+            partial(Translation.invalidate_trees, langtags, namespaces),
+            using=using)
+    return deleted
+
+
+class BCP47QuerySet(models.QuerySet):
+    def delete(self):
+        return delete_whole_trees(
+            self.db, super().delete,
+            langtags=list(self.values_list('langtag', flat=True)))
+
+
+class NamespaceQuerySet(models.QuerySet):
+    def delete(self):
+        return delete_whole_trees(
+            self.db, super().delete,
+            namespaces=list(self.values_list('text', flat=True)))
+
+
+@lru_cache(maxsize=getattr(settings, 'TRADUKOJ_NEGOTIATION_CACHE_SIZE', 512))
+def _best_langtags(accept, langtags):
+    """Memoized best matches of a normalized accept header."""
+    data = []
+    for accept_lang, _ in parse_accept_lang_header(accept):
+        match = best_match(accept_lang, list(langtags))
+        data.append((match[0], match[1], accept_lang))
+    return tuple(data)
 
 
 def best_langtag_list(accept):
-    enabledlangs = []
-    for bcp47instance in BCP47.objects.filter(enabled=True):
-        enabledlangs.append(bcp47instance.langtag)
-
+    # parse_accept_lang_header is case insensitive and ignores whitespaces
+    accept = ''.join(accept.split()).lower()
     data = []
-    for accept_lang, _ in parse_accept_lang_header(accept):
-        match = best_match(accept_lang, enabledlangs)
+    for langtag, score, accept_lang in _best_langtags(accept,
+                                                      enabled_langtags()):
         data.append({
-            'langtag': match[0],
-            'score': match[1],
+            'langtag': langtag,
+            'score': score,
             'accept_lang': accept_lang,
         })
     return data
 
 
+class JSONBObjectAgg(models.Aggregate):
+    """PostgreSQL jsonb_object_agg(key, value) aggregate."""
+    function = 'JSONB_OBJECT_AGG'
+    output_field = models.TextField()
+
+
+def translation_text_expression(prefix=''):
+    """Return translation text (largue or small) as a db expression."""
+    return models.Case(
+        models.When(
+            **{f'{prefix}is_largue': True},
+            then=models.F(f'{prefix}largue')),
+        default=models.F(f'{prefix}small'),
+        output_field=models.TextField(),
+    )
+
+
 class BCP47(models.Model):
     DIRECTION_LTR = 0
     DIRECTION_RTL = 1
@@ -63,11 +206,32 @@ class BCP47(models.Model):
     enabled = models.BooleanField(default=True)
     # used as fallback
     default = models.BooleanField(default=False)
+    # used as fallback before default, instead of langtag parent (es-AR -> es)
+    fallback = models.ForeignKey(
+        'self',
+        null=True,
+        blank=True,
+        related_name='fallback_of',
+        on_delete=models.SET_NULL,
+        verbose_name='Fallback lang')
     direction = models.IntegerField(default=0, choices=DIRECTION_CHOICES)
 
+    objects = BCP47QuerySet.as_manager()
+
+    def delete(self, using=None, keep_parents=False):
+        return delete_whole_trees(
+            using or router.db_for_write(BCP47, instance=self),
+            partial(super().delete, using, keep_parents),
+            langtags=[self.langtag])
+
     def __str__(self):
         return f"{self.langtag} - {self.name}"
 
+    class Meta:
+        # every tree and endpoint query filters bcp47__langtag and
+        # bcp47__enabled
+        indexes = [models.Index(fields=['langtag', 'enabled'])]
+
 
 class Namespace(models.Model):
     text = models.CharField(
@@ -76,18 +240,56 @@ class Namespace(models.Model):
         null=False,
         blank=False,
         verbose_name='text key')
+    # bumped by each write of namespace translations, see revisions.py
+    revision = models.BigIntegerField(default=0)
+
+    objects = NamespaceQuerySet.as_manager()
+
+    def delete(self, using=None, keep_parents=False):
+        return delete_whole_trees(
+            using or router.db_for_write(Namespace, instance=self),
+            partial(super().delete, using, keep_parents),
+            namespaces=[self.text])
 
     def __str__(self):
         return self.text
 
 
+class TranslationKeyQuerySet(models.QuerySet):
+    def delete(self):
+        return delete_translations(
+            self.db, super().delete,
+            Translation.objects.filter(key__in=self.values('pk')))
+
+
+class TranslationKeyManager(
+        models.Manager.from_queryset(TranslationKeyQuerySet)):
+    def bulk_translate(self, translations, batch_size=BATCH_SIZE):
+        """Write translations of many keys with batched queries.
+
+        translations is a {(namespace, key text): {langtag: text}} dict,
+        missing namespaces, keys and langtags are created.
+
+        Return a {(namespace, key text): {langtag: status}} dict, where
+        status is one of 'created', 'updated' or 'unchanged'.
+
+        """
+        return bulk_translate(translations, self.db, batch_size)
+
+
 class TranslationKey(models.Model):
 
     init_namespace = None
+    init_translations = None
     auto_key_text = True
 
+    # indexed for lookups without namespace (TradukojKeyTextField)
     text = models.CharField(
-        max_length=255, null=False, blank=False, verbose_name='text key')
+        max_length=255,
+        null=False,
+        blank=False,
+        db_index=True,
+        verbose_name='text key')
 
     namespace = models.ForeignKey(
         'Namespace',
@@ -97,14 +299,14 @@ class TranslationKey(models.Model):
         on_delete=models.CASCADE)
     public = models.BooleanField(default=True)
 
+    objects = TranslationKeyManager()
+
     def __init__(self, *args, **kwargs):
         # create namespace into db on init_namespace set
         if 'init_namespace' in kwargs:
             self.init_namespace = kwargs['init_namespace']
-            namespace, _created = Namespace.objects.get_or_create(
-                text=kwargs['init_namespace'])
-
-            kwargs['namespace'] = namespace
+            kwargs['namespace_id'] = get_namespace_id(
+                kwargs['init_namespace'], create=True)
             del kwargs['init_namespace']
 
         # parameter to disable auto key text generation
@@ -112,8 +314,19 @@ class TranslationKey(models.Model):
             self.auto_key_text = kwargs['auto_key_text']
             del kwargs['auto_key_text']
 
+        # {langtag: text} written on save, or on bulk creation of owners
+        if 'init_translations' in kwargs:
+            self.init_translations = kwargs['init_translations']
+            del kwargs['init_translations']
+
         super().__init__(*args, **kwargs)
 
+    def delete(self, using=None, keep_parents=False):
+        using = using or router.db_for_write(TranslationKey, instance=self)
+        return delete_translations(
+            using, partial(super().delete, using, keep_parents),
+            Translation.objects.filter(key_id=self.pk))
+
     def get_init_namespace(self):
         return self.init_namespace
 
@@ -122,18 +335,37 @@ class TranslationKey(models.Model):
         if created:
             bcp47.enabled = True
             bcp47.save()
-        translation, _created = Translation.objects.get_or_create(
-            key=self, bcp47=bcp47)
-        if len(translation_text) > 255:
-            translation.is_largue = True
-            translation.largue = translation_text
-        else:
-            translation.is_largue = False
-            translation.small = translation_text
+        is_largue, small, largue = split_translation_text(translation_text)
+        translation, created = Translation.objects.get_or_create(
+            key=self,
+            bcp47=bcp47,
+            defaults={
+                'is_largue': is_largue,
+                'small': small,
+                'largue': largue,
+            })
+        if created:
+            return
 
+        translation.is_largue = is_largue
+        translation.small = small
+        translation.largue = largue
         translation.save()
 
-    def get_translation(self, langtag=None):
+    def get_translation(self, langtag=None, fallback=False):
+        if langtag and fallback:
+            # single query for the whole fallback chain
+            chain = fallback_chain(langtag)
+            translations = {
+                translation.bcp47.langtag: translation
+                for translation in self.translations.select_related(
+                    'bcp47').filter(bcp47__langtag__in=chain)
+            }
+            for chain_langtag in chain:
+                if chain_langtag in translations:
+                    return translations[chain_langtag]
+            return None
+
         try:
             if not langtag:
                 translation = self.translations.get(bcp47__default=True)
@@ -143,12 +375,44 @@ class TranslationKey(models.Model):
         except Translation.DoesNotExist:
             return None
 
-    def get_translation_str(self, langtag=None):
-        translation = self.get_translation(langtag)
+    def get_translation_str(self, langtag=None, fallback=False):
+        translation = self.get_translation(langtag, fallback)
         if not translation:
             return ''
         return translation.str_translation()
 
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(
+            TranslationKey, instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            previous = None
+            if self.pk is not None:
+                previous = TranslationKey.objects.using(using).filter(
+                    pk=self.pk).values_list('namespace_id', 'public',
+                                            'text').first()
+            if not previous or previous == (self.namespace_id, self.public,
+                                            self.text):
+                super().save(*args, **kwargs)
+            else:
+                # old paths are gone, or hidden from public trees
+                moved = (previous[0], previous[2]) != (self.namespace_id,
+                                                       self.text)
+                if moved or (previous[1] and not self.public):
+                    tombstone_translations(
+                        self.translations.using(using).all(),
+                        next_revision(previous[0], using),
+                        using,
+                        public_only=not moved,
+                    )
+                super().save(*args, **kwargs)
+                self.translations.using(using).update(
+                    revision=next_revision(self.namespace_id, using))
+
+            if self.init_translations:
+                for langtag, text in self.init_translations.items():
+                    self.translate(langtag, text)
+                self.init_translations = None
+
     def __str__(self):
         return f"{self.namespace}.{self.text}"
 
@@ -157,9 +421,15 @@ class TranslationKey(models.Model):
             'namespace',
             'text',
         )
+        # public trees and endpoints filter key__namespace and key__public
+        indexes = [models.Index(fields=['namespace', 'public'])]
+
+
+class TranslationQuerySet(models.QuerySet):
+    def delete(self):
+        return delete_translations(self.db, super().delete, self)
 
 
-# TODO: update cache on save event
 class Translation(models.Model):
     key = models.ForeignKey(
         TranslationKey,
@@ -177,18 +447,45 @@ class Translation(models.Model):
     small = models.CharField(
         max_length=255, null=True, blank=True, verbose_name='small')
     largue = models.TextField(null=True, blank=True, verbose_name='largue')
+    # namespace revision of last write, see revisions.py
+    revision = models.BigIntegerField(default=0)
+
+    objects = TranslationQuerySet.as_manager()
 
     class Meta:
         unique_together = (
             'key',
             'bcp47',
         )
+        indexes = [models.Index(fields=['bcp47', 'revision'])]
+
+    def save(self, *args, **kwargs):
+        using = kwargs.get('using') or router.db_for_write(
+            Translation, instance=self)
+        with transaction.atomic(using=using, savepoint=False):
+            previous = None
+            if self.pk is not None:
+                previous = translation_location(self.pk, using)
+            # read by cache signals
+            self._tradukoj_previous = previous
+
+            namespace_id = None
+            if previous and previous[6:] == (self.key_id, self.bcp47_id):
+                namespace_id = previous[5]
+            elif previous:
+                # key or lang switched, old path is gone
+                tombstone_location(previous, using)
+            if namespace_id is None:
+                namespace_id = self.key.namespace_id
+            self.revision = next_revision(namespace_id, using)
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = set(
+                    kwargs['update_fields']) | {'revision'}
+            super().save(*args, **kwargs)
 
-    # Future use
-    # @staticmethod
-    # def database_has_jsonb_agg():
-    #     connection = connections[DEFAULT_DB_ALIAS]
-    #     return connection.features.has_jsonb_agg
+    @staticmethod
+    def database_has_jsonb_agg(using):
+        return connections[using].vendor == 'postgresql'
 
     def str_translation(self):
         if self.is_largue:
@@ -203,11 +500,8 @@ class Translation(models.Model):
         This will update cache if needed.
 
         """
-
-        data = cache.get('tradukoj_pub_tr_{0}_{1}'.format(langtag, namespace))
-        if data is None:
-            Translation.update_langtag_cache(langtag, namespace)
-        return cache.get('tradukoj_pub_tr_{0}_{1}'.format(langtag, namespace))
+        bundle = Translation.get_cached_public_bundle(langtag, namespace)
+        return json.loads(bundle['json'])
 
     @staticmethod
     def get_cached_private_translations(langtag, namespace):
@@ -217,86 +511,246 @@ class Translation(models.Model):
         This will update cache if needed.
 
         """
-        data = cache.get('tradukoj_priv_tr_{0}_{1}'.format(langtag, namespace))
-        if data is None:
-            Translation.update_langtag_cache(langtag, namespace, False)
-        return cache.get('tradukoj_priv_tr_{0}_{1}'.format(langtag, namespace))
+        bundle = Translation.get_cached_private_bundle(langtag, namespace)
+        return json.loads(bundle['json'])
+
+    @staticmethod
+    def get_cached_public_bundle(langtag, namespace):
+        """
+        Return cached json bytes of all translations and its hash.
+
+        This will update cache if needed.
+
+        """
+        return get_tree(
+            langtag, namespace,
+            partial(Translation.build_langtag_tree, langtag, namespace))
+
+    @staticmethod
+    def get_cached_private_bundle(langtag, namespace):
+        """
+        Return cached json bytes of all translations and its hash.
+
+        This will update cache if needed.
+
+        """
+        return get_tree(
+            langtag, namespace,
+            partial(Translation.build_langtag_tree, langtag, namespace, False),
+            False)
+
+    @staticmethod
+    def get_cached_public_fallback_bundle(langtag, namespace):
+        """
+        Return cached json bytes and hash of all translations, merged with
+        translations of langtag fallback chain.
+
+        This will update cache if needed.
+
+        """
+        return get_fallback_tree(langtag, namespace, fallback_chain(langtag),
+                                 Translation.build_langtag_trees)
+
+    @staticmethod
+    def get_cached_private_fallback_bundle(langtag, namespace):
+        """
+        Return cached json bytes and hash of all translations, merged with
+        translations of langtag fallback chain.
+
+        This will update cache if needed.
+
+        """
+        return get_fallback_tree(
+            langtag, namespace, fallback_chain(langtag),
+            partial(Translation.build_langtag_trees, public=False), False)
+
+    @staticmethod
+    def get_cached_public_bundles(pairs):
+        """
+        Return cached json bytes and hash of every (langtag, namespace) pair.
+
+        This will update cache if needed, with a single query.
+
+        """
+        return get_trees(pairs, Translation.build_langtag_trees)
+
+    @staticmethod
+    def get_cached_private_bundles(pairs):
+        """
+        Return cached json bytes and hash of every (langtag, namespace) pair.
+
+        This will update cache if needed, with a single query.
+
+        """
+        return get_trees(
+            pairs, partial(Translation.build_langtag_trees, public=False),
+            False)
 
     @staticmethod
     def update_langtag_cache(langtag, namespace, public=True):
         """Update cache with big json of all translations."""
-        data = {langtag: {namespace: {}}}
-        queryset = Translation.objects.filter(
-            key__namespace__text=namespace,
-            bcp47__enabled=True,
-            bcp47__langtag=langtag,
-        ).annotate(annotate_key_text=models.F('key__text'))
+        return rebuild_tree(
+            langtag, namespace,
+            partial(Translation.build_langtag_tree, langtag, namespace,
+                    public), public)
 
-        cache_string = 'tradukoj_priv_tr_{0}_{1}'.format(langtag, namespace)
-        if public:
-            cache_string = 'tradukoj_pub_tr_{0}_{1}'.format(langtag, namespace)
-            queryset = queryset.filter(key__public=True)
+    @staticmethod
+    def build_langtag_tree(langtag, namespace, public=True):
+        """Return big json of all translations."""
+        return Translation.build_langtag_trees([(langtag, namespace)],
+                                               public)[(langtag, namespace)]
+
+    @staticmethod
+    def build_langtag_trees(pairs, public=True):
+        """Return a {(langtag, namespace): big json} dict for pairs.
+
+        All trees are built with a single query.
+
+        """
+        data = {(langtag, namespace): {langtag: {namespace: {}}}
+                for langtag, namespace in pairs}
+        namespaces = {
+            namespace_id: namespace
+            for namespace, namespace_id in get_namespace_ids(
+                {namespace for _, namespace in pairs}).items()
+        }
+        if not namespaces:
+            return data
+
+        queryset = Translation.tree_queryset(
+            namespaces, {langtag for langtag, _ in pairs}, public)
 
         # hacemos foreach por las traducciones
-        for translation in queryset:
-            if not translation.str_translation():
+        for langtag, namespace_id, key_text, translation in (
+                Translation.tree_rows(queryset, 'key__namespace_id')):
+            tree = data.get((langtag, namespaces[namespace_id]))
+            if tree is None:
                 continue
 
-            if not translation.str_translation().strip():
+            if not translation:
+                continue
+
+            if not translation.strip():
                 continue
 
             # si la key de traducción es de tipo login.form.username
             # hacemos split en el punto (.) e iteramos sobre él.
-            #
-            # _current node contendrá (por referencia) el último nodo creado
-            # de este mode, de un string tipo login.form.username vamos creando:
-            # data[langtag][namespace]['login'] = {}
-            # data[langtag][namespace]['login']['form'] = {}
-            # data[langtag][namespace]['login']['form']['username'] = 'traduccion'
-            deep = translation.annotate_key_text.split('.')
-            _current_node = data[langtag][namespace]
-            for i, element in enumerate(deep):
-                # en el último elemento dejamos de profundizar y colocamos la traducción
-                if i == (len(deep) - 1):
-                    # Incongruity key error.
-                    # _current_node debe ser un dict,
-                    # de lo contrario algo ha ido mal.
-                    # Posibles causas:
-                    # 1) Existe una key node1.node2 = text y otra
-                    #    node1.node2.node3 = text
-                    #    con lo cual el algoritmo espera que node1.node2
-                    #    sea un dict para añadirle una nueva clave, pero
-                    #    se encuentra un string
-                    if not isinstance(_current_node, dict):
-                        break
-                    _current_node[element] = translation.str_translation()
-                    break
-                if not element in _current_node:
-                    _current_node[element] = {}
-
-                # Solución parcial para gestionar
-                # el fallo Incongruity key (arriba)
-                # Si encuentra un elemento que se espera sea dict y no lo es,
-                # sobreescribir como dict.
-                # Esto provocará que node1.text2 = "text" se sobreescriba con
-                # node1.text2 = {} para poder profundizar en el árbol
-                # TODO: buscar cómo gestionar esto en Tradukoj
-                # Opción 1: evitar keys node1.node2 si existe node1.node2.node3
-                #           mediante validación en modelo
-                # Opción 2: devolver un array [{traducciones}, {traducciones}]
-                #           donde en el primer dict devolver las traduccionnes
-                #           normales node1.node2.node3 y en el segundo dict
-                #            devolver node1.node2
-                if not isinstance(_current_node[element], dict):
-                    _current_node[element] = {}
-
-                # aquí está la magia, la variable _current_node es seteada por referencia
-                _current_node = _current_node[element]
+            # (ver tradukoj.trees.insert_node)
+            insert_node(tree[langtag][namespaces[namespace_id]], key_text,
+                        translation)
+
+        return data
 
+    @staticmethod
+    def tree_queryset(namespace_ids, langtags, public=True):
+        """Return translations of trees of namespace ids and langtags."""
+        queryset = Translation.objects.filter(
+            key__namespace_id__in=namespace_ids,
+            bcp47__enabled=True,
+            bcp47__langtag__in=langtags,
+        )
         if public:
-            return cache.set(cache_string, data)
+            queryset = queryset.filter(key__public=True)
+        return queryset
+
+    @staticmethod
+    def tree_rows_queryset(queryset, namespace_field='key__namespace__text'):
+        """Return the values queryset read by `tree_rows`."""
+        if Translation.database_has_jsonb_agg(queryset.db):
+            return queryset.values(
+                'bcp47__langtag', namespace_field).annotate(
+                    pairs=JSONBObjectAgg('key__text',
+                                         translation_text_expression())
+                ).order_by().values_list('bcp47__langtag', namespace_field,
+                                         'pairs')
+        return queryset.values_list(
+            'bcp47__langtag',
+            namespace_field,
+            'key__text',
+            translation_text_expression(),
+        )
+
+    @staticmethod
+    def tree_rows(queryset, namespace_field='key__namespace__text'):
+        """Yield (langtag, namespace, key text, translation text) of queryset.
+
+        Translations are resolved by db without hydrating models: on
+        PostgreSQL in a jsonb object per langtag and namespace, otherwise as
+        tuples. Translation text could be None. namespace is the value of
+        namespace_field, 'key__namespace_id' skips the namespace join.
+
+        """
+        rows = Translation.tree_rows_queryset(queryset, namespace_field)
+        if Translation.database_has_jsonb_agg(queryset.db):
+            for langtag, namespace, pairs in rows:
+                if isinstance(pairs, str):
+                    pairs = json.loads(pairs)
+                for key_text, translation in pairs.items():
+                    yield langtag, namespace, key_text, translation
+            return
 
-        return cache.set(cache_string, data)
+        yield from rows.iterator()
+
+    @staticmethod
+    def refresh_langtag_cache(queryset):
+        """Save a new revision into the translations of queryset and patch
+        cached trees with them once the transaction (if any) commits.
+
+        Call it after bulk writes that bypass signals, like
+        `Translation.objects.bulk_create` or `queryset.update`.
+
+        """
+        stamp_revisions(queryset, queryset.db)
+        changes = {}
+        rows = queryset.filter(bcp47__enabled=True).values_list(
+            'bcp47__langtag',
+            'key__namespace__text',
+            'key__public',
+            'key__text',
+            'is_largue',
+            'small',
+            'largue',
+        )
+        for langtag, namespace, public, key_text, is_largue, small, largue in rows:
+            change = (key_text, largue if is_largue else small)
+            changes.setdefault((langtag, namespace, False), []).append(change)
+            if public:
+                changes.setdefault((langtag, namespace, True), []).append(change)
+
+        for (langtag, namespace, public), tree_changes in changes.items():
+            patch_tree_on_commit(langtag, namespace, tree_changes, public,
+                                 queryset.db)
+
+    @staticmethod
+    def invalidate_langtag_cache(langtag=None, namespace=None, public=None):
+        """Save a new revision into every translation of the trees and mark
+        cached trees as dirty.
+
+        Call it after bulk writes that bypass signals and can not be patched,
+        like `queryset.update` of keys. Delta clients get every translation
+        of the trees again. A None langtag or namespace means all of them.
+
+        """
+        translations = Translation.objects.all()
+        if langtag is not None:
+            translations = translations.filter(bcp47__langtag=langtag)
+        if namespace is not None:
+            translations = translations.filter(key__namespace__text=namespace)
+        stamp_revisions(translations, router.db_for_write(Translation))
+        Translation.invalidate_trees(
+            None if langtag is None else [langtag],
+            None if namespace is None else [namespace], public)
+
+    @staticmethod
+    def invalidate_trees(langtags=None, namespaces=None, public=None):
+        """Mark cached trees of langtags and namespaces as dirty, None means
+        all of them."""
+        delete_snapshots(langtags, namespaces, public)
+        if langtags is None:
+            langtags = BCP47.objects.values_list('langtag', flat=True)
+        if namespaces is None:
+            namespaces = Namespace.objects.values_list('text', flat=True)
+        mark_dirty(list(langtags), list(namespaces), public)
 
     def __str__(self):
         if self.is_largue:
@@ -304,6 +758,144 @@ class Translation(models.Model):
         return f"({self.bcp47}) {self.key} => {self.small}"
 
 
+def translation_location(pk, using=None):
+    """Return (langtag, enabled, namespace, public, key text, namespace id,
+    key id, bcp47 id) of a translation, None if it does not exist."""
+    return Translation.objects.using(using).filter(pk=pk).values_list(
+        'bcp47__langtag',
+        'bcp47__enabled',
+        'key__namespace__text',
+        'key__public',
+        'key__text',
+        'key__namespace_id',
+        'key_id',
+        'bcp47_id',
+    ).first()
+
+
+def tombstone_location(location, using):
+    """Record a tombstone of a translation location."""
+    _langtag, _enabled, _namespace, public, key_text, namespace_id, _key_id, \
+        bcp47_id = location
+    TranslationTombstone.objects.using(using).create(
+        namespace_id=namespace_id,
+        bcp47_id=bcp47_id,
+        key_text=key_text,
+        public=public,
+        revision=next_revision(namespace_id, using),
+    )
+
+
+def delete_translations(using, delete, translations):
+    """Run delete() of translations, or of the keys they belong to.
+
+    Tombstones of translations are written in bulk, with a revision per
+    namespace, and affected trees are patched once on commit (unless cache
+    signals are suspended), instead of doing it for every translation from
+    signals.
+
+    """
+    with transaction.atomic(using=using, savepoint=False):
+        locations = list(
+            translations.using(using).values_list(
+                'bcp47__langtag',
+                'bcp47__enabled',
+                'key__namespace__text',
+                'key__public',
+                'key__text',
+                'key__namespace_id',
+                'key_id',
+                'bcp47_id',
+            ))
+        TranslationTombstone.objects.using(using).bulk_create(
+            [
+                TranslationTombstone(
+                    namespace_id=namespace_id,
+                    bcp47_id=bcp47_id,
+                    key_text=key_text,
+                    public=public,
+                    revision=next_revision(namespace_id, using),
+                ) for _langtag, _enabled, _namespace, public, key_text,
+                namespace_id, _key_id, bcp47_id in locations
+            ],
+            batch_size=BATCH_SIZE,
+        )
+
+        changes = {}
+        for langtag, enabled, namespace, public, key_text, *_ids in locations:
+            # with signals suspended, caller takes care of cache
+            if not enabled or cache_signals_suspended():
+                continue
+            changes.setdefault((langtag, namespace, False), []).append(
+                (key_text, None))
+            if public:
+                changes.setdefault((langtag, namespace, True), []).append(
+                    (key_text, None))
+        for (langtag, namespace, public), tree_changes in changes.items():
+            patch_tree_on_commit(langtag, namespace, tree_changes, public,
+                                 using)
+
+        with suspend_cache_signals():
+            return delete()
+
+
+class TranslationTombstone(models.Model):
+    """A deleted translation key path, used by delta sync endpoints."""
+    namespace = models.ForeignKey(
+        Namespace,
+        null=False,
+        blank=False,
+        related_name='tombstones',
+        on_delete=models.CASCADE)
+    bcp47 = models.ForeignKey(
+        BCP47,
+        null=False,
+        blank=False,
+        related_name='tombstones',
+        on_delete=models.CASCADE)
+    key_text = models.CharField(
+        max_length=255, null=False, blank=False, verbose_name='text key')
+    # removed from public trees
+    public = models.BooleanField(default=True)
+    # removed from private trees, false when key was hidden from public ones
+    private = models.BooleanField(default=True)
+    revision = models.BigIntegerField()
+
+    class Meta:
+        indexes = [models.Index(fields=['namespace', 'bcp47', 'revision'])]
+
+    def __str__(self):
+        return (f"({self.bcp47}) {self.namespace}.{self.key_text} "
+                f"@{self.revision}")
+
+
+class TranslationSnapshot(models.Model):
+    """Last built JSON tree of a langtag and namespace, see snapshots.py."""
+    # sha1 of the tree cache key
+    id = models.CharField(max_length=40, primary_key=True)
+    langtag = models.CharField(
+        max_length=255,
+        null=False,
+        blank=False,
+        verbose_name='IETF BCP 47 langtag')
+    namespace = models.ForeignKey(
+        Namespace,
+        null=False,
+        blank=False,
+        related_name='snapshots',
+        on_delete=models.CASCADE)
+    public = models.BooleanField(default=True)
+    content = models.BinaryField()
+    etag = models.CharField(max_length=40)
+    # namespace revision the tree was built at
+    revision = models.BigIntegerField()
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        visibility = 'public' if self.public else 'private'
+        return f"({visibility} {self.langtag}) {self.namespace_id}"
+
+
 class GetTextFile(models.Model):
     FILE_TYPE_PO = 0
     FILE_TYPE_MO = 1
@@ -328,6 +920,10 @@ class GetTextFile(models.Model):
         db_index=True, auto_now=True, verbose_name='Last updated date')
     done = models.BooleanField(default=False)
     done_with_errors = models.BooleanField(default=False)
+    started_date = models.DateTimeField(
+        null=True, blank=True, verbose_name='Started date')
+    finished_date = models.DateTimeField(
+        null=True, blank=True, verbose_name='Finished date')
     log = models.TextField(
         null=True,
         blank=True,
@@ -342,25 +938,17 @@ class GetTextFile(models.Model):
             tmpfile.seek(0)
 
             gettext_file = polib.pofile(tmpfile.name)
-            for entry in gettext_file:
-                translation_key, _created = TranslationKey.objects.get_or_create(
-                    text=entry.msgid, namespace=self.namespace)
-
-                translation, _created = Translation.objects.get_or_create(
-                    key=translation_key, bcp47=self.bcp47)
-
-                if len(entry.msgstr) > 255:
-                    translation.is_largue = True
-                    translation.largue = entry.msgstr
-                    translation.small = None
-                else:
-                    translation.is_largue = False
-                    translation.small = entry.msgstr
-                    translation.largue = None
-
-                translation.save()
+            stats = import_pofile(self, gettext_file)
             tmpfile.close()
 
+        self.log = (
+            "Imported {entries} entries ({created_keys} new keys, {created} "
+            "created, {updated} updated, {unchanged} unchanged translations) "
+            "in {seconds:.2f}s: {rows_per_second:.0f} rows/s, {queries} "
+            "queries".format(**stats))
+        GetTextFile.objects.filter(pk=self.pk).update(log=self.log)
+        return True
+
     def __str__(self):
         return "{0} {1} {2} ".format(self.bcp47, self.namespace.text,
                                      self.file)
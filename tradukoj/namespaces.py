@@ -0,0 +1,149 @@
+"""
+Process-wide cache of namespace ids by text.
+
+Namespace lookups by text are done once per process. Saving or deleting a
+Namespace clears the cache of its process, and changes a version token into
+the shared cache so other processes clear theirs too: the token is checked at
+most once every TRADUKOJ_NAMESPACE_CHECK_INTERVAL seconds.
+
+Inside transactions, ids of namespaces saved by the transaction are cached
+once it commits, as their rows could be rolled back. The rest are cached
+right away.
+
+Settings:
+    TRADUKOJ_NAMESPACE_CHECK_INTERVAL: max seconds cached ids are used
+        without checking the version token, default 1.
+
+"""
+import threading
+import time
+import uuid
+from functools import partial
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_CACHE_KEY = 'tradukoj_namespaces_version'
+
+
+def get_check_interval():
+    return getattr(settings, 'TRADUKOJ_NAMESPACE_CHECK_INTERVAL', 1)
+
+
+class NamespaceIds:
+    """Thread-safe {namespace text: id} dict validated by a version token."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = {}
+        self._version = None
+        self._checked = None
+
+    def get_many(self, texts):
+        """Return a {text: id} dict of cached texts."""
+        self._check()
+        ids = self._ids
+        return {text: ids[text] for text in texts if text in ids}
+
+    def set_many(self, ids):
+        with self._lock:
+            self._ids.update(ids)
+
+    def clear(self):
+        with self._lock:
+            self._ids = {}
+            self._checked = None
+
+    def _check(self):
+        now = time.monotonic()
+        if (self._checked is not None
+                and now - self._checked < get_check_interval()):
+            return
+
+        version = cache.get(VERSION_CACHE_KEY)
+        with self._lock:
+            if version != self._version:
+                self._ids = {}
+                self._version = version
+            self._checked = now
+
+
+namespace_ids = NamespaceIds()
+
+
+def _saved_texts(connection):
+    return connection.__dict__.setdefault('_tradukoj_saved_namespaces', set())
+
+
+def defer_namespace_ids(texts, using=None):
+    """Cache ids of namespace texts saved by current transaction only once
+    it commits."""
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        return
+    saved = _saved_texts(connection)
+    saved.update(texts)
+    # texts of rolled back transactions are kept until next lookup outside
+    # transactions, their ids are just cached later
+    transaction.on_commit(saved.clear, using=using)
+
+
+def get_namespace_ids(texts, create=False):
+    """Return a {text: id} dict of namespace texts.
+
+    Missing namespaces are created with create, left out otherwise.
+
+    """
+    from .bulk import get_or_create_ids
+    from .models import Namespace
+
+    texts = list(dict.fromkeys(texts))
+    ids = namespace_ids.get_many(texts)
+    missing = [text for text in texts if text not in ids]
+    if not missing:
+        return ids
+
+    using = Namespace.objects.db
+    if create:
+        loaded = get_or_create_ids(
+            Namespace,
+            'text',
+            missing,
+            using,
+            on_create=partial(defer_namespace_ids, using=using))
+    else:
+        loaded = dict(
+            Namespace.objects.filter(text__in=missing).values_list(
+                'text', 'id'))
+    ids.update(loaded)
+
+    connection = transaction.get_connection(using)
+    saved = _saved_texts(connection)
+    if not connection.in_atomic_block:
+        saved.clear()
+        namespace_ids.set_many(loaded)
+        return ids
+
+    # rows saved by the transaction could be rolled back
+    pending = {text: pk for text, pk in loaded.items() if text in saved}
+    namespace_ids.set_many(
+        {text: pk for text, pk in loaded.items() if text not in saved})
+    if pending:
+        transaction.on_commit(
+            lambda: namespace_ids.set_many(pending), using=using)
+    return ids
+
+
+def get_namespace_id(text, create=False):
+    """Return id of a namespace text, None if it does not exist.
+
+    Missing namespace is created with create.
+
+    """
+    return get_namespace_ids([text], create).get(text)
+
+
+def invalidate_namespace_ids():
+    """Clear cached ids of every process."""
+    cache.set(VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+    namespace_ids.clear()
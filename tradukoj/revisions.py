@@ -0,0 +1,163 @@
+"""
+Translation revisions, used by delta sync endpoints.
+
+Every namespace has a monotonic revision, bumped once by each transaction
+writing its translations. Saved translations store the revision they were
+written at, and deleted ones (or the ones hidden from public trees) leave a
+TranslationTombstone with it, so clients ask only for changes since the
+revision they already have.
+
+Namespace row stays locked from the revision bump until the transaction ends,
+so revisions are commited in order: every revision lower or equal than the
+commited namespace revision is already visible.
+
+Deletes of Translation and TranslationKey querysets write their tombstones,
+signals suspended or not. Bulk writes that do not set revisions
+(`bulk_create`, `queryset.update`) get them from
+`Translation.refresh_langtag_cache` or `Translation.invalidate_langtag_cache`.
+
+"""
+from django.db import models, transaction
+
+from .bulk import BATCH_SIZE
+from .namespaces import get_namespace_id
+from .transactions import transaction_buffer
+
+
+def next_revision(namespace_id, using):
+    """Return the revision of namespace writes in current transaction.
+
+    Namespace revision is bumped once per transaction (and savepoint), every
+    write of the transaction shares it. Call it inside a transaction, with
+    the writes using the revision.
+
+    """
+    from .models import Namespace
+
+    revisions = transaction_buffer('revisions', using=using)
+    if revisions is not None and namespace_id in revisions:
+        return revisions[namespace_id]
+
+    namespaces = Namespace.objects.using(using).filter(pk=namespace_id)
+    namespaces.update(revision=models.F('revision') + 1)
+    revision = namespaces.values_list('revision', flat=True).get()
+    if revisions is not None:
+        revisions[namespace_id] = revision
+    return revision
+
+
+def current_revision(namespace_id):
+    """Return commited revision of a namespace, 0 if it does not exist."""
+    from .models import Namespace
+
+    revision = Namespace.objects.filter(pk=namespace_id).values_list(
+        'revision', flat=True).first()
+    return revision or 0
+
+
+def tombstone_translations(queryset, revision, using, public_only=False):
+    """Record a tombstone of each queryset translation at revision.
+
+    Call it before translations are deleted, or with public_only when their
+    keys are hidden from public trees.
+
+    """
+    from .models import TranslationTombstone
+
+    TranslationTombstone.objects.using(using).bulk_create(
+        [
+            TranslationTombstone(
+                namespace_id=namespace_id,
+                bcp47_id=bcp47_id,
+                key_text=key_text,
+                public=public,
+                private=not public_only,
+                revision=revision,
+            ) for namespace_id, bcp47_id, key_text, public in queryset.
+            values_list('key__namespace_id', 'bcp47_id', 'key__text',
+                        'key__public')
+        ],
+        batch_size=BATCH_SIZE,
+    )
+
+
+def stamp_revisions(translations, using):
+    """Bump revisions of the namespaces of translations and save them into
+    their rows.
+
+    Used after bulk writes that do not set revisions, so delta clients and
+    static exports get those translations again.
+
+    """
+    with transaction.atomic(using=using, savepoint=False):
+        translations = translations.using(using)
+        namespace_ids = set(
+            translations.order_by().values_list('key__namespace_id',
+                                                flat=True).distinct())
+        for namespace_id in namespace_ids:
+            translations.filter(key__namespace_id=namespace_id).update(
+                revision=next_revision(namespace_id, using))
+
+
+def translation_delta(langtag, namespace, since, public=True):
+    """Return changes of a langtag/namespace since a revision.
+
+    Return a dict with the current `revision`, `changed` {key path: text}
+    and `removed` key paths, translations that became blank are removed.
+    Clients should drop their translations when `reset` is true: since is 0
+    or unknown, so every translation is sent.
+
+    """
+    from .models import Translation, TranslationTombstone
+
+    namespace_id = get_namespace_id(namespace)
+    # read revision first, rows of newer revisions are not commited yet
+    revision = current_revision(namespace_id)
+    reset = not 0 < since <= revision
+    if reset:
+        since = 0
+
+    translations = Translation.objects.filter(
+        bcp47__langtag=langtag,
+        bcp47__enabled=True,
+        key__namespace_id=namespace_id,
+        revision__gt=since,
+        revision__lte=revision,
+    )
+    if public:
+        translations = translations.filter(key__public=True)
+    changed = {}
+    blank = set()
+    for key_text, is_largue, small, largue in translations.values_list(
+            'key__text', 'is_largue', 'small', 'largue'):
+        text = largue if is_largue else small
+        # blank translations are not nodes of trees
+        if text and text.strip():
+            changed[key_text] = text
+        else:
+            blank.add(key_text)
+
+    removed = []
+    if not reset:
+        tombstones = TranslationTombstone.objects.filter(
+            bcp47__langtag=langtag,
+            namespace_id=namespace_id,
+            revision__gt=since,
+            revision__lte=revision,
+        )
+        if public:
+            tombstones = tombstones.filter(public=True)
+        else:
+            tombstones = tombstones.filter(private=True)
+        removed = sorted((set(tombstones.values_list('key_text', flat=True))
+                          | blank) - set(changed))
+
+    return {
+        'langtag': langtag,
+        'namespace': namespace,
+        'since': since,
+        'revision': revision,
+        'reset': reset,
+        'changed': changed,
+        'removed': removed,
+    }
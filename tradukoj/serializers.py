@@ -13,15 +13,32 @@ class BCP47Serializer(serializers.ModelSerializer):
 
     # TODO: Implement MaxMind Geo-IP location
     def get_best_match_score(self, obj):
-        # best_match(accept_lang, enabledlangs, min_score=50)
+        # nested serializers share root context, so scores are computed once
+        # per request and langtag
+        scores = self.context.setdefault('tradukoj_best_match_scores', {})
+        if obj.langtag not in scores:
+            scores[obj.langtag] = self.compute_best_match_score(obj.langtag)
+        return scores[obj.langtag]
+
+    def get_accept_langs(self):
+        accept_lang = self.context.get('tradukoj_accept_langs')
+        if accept_lang is not None:
+            return accept_lang
+
         accept_header = self.context['request'].META.get('HTTP_ACCEPT_LANGUAGE', '')
         accept_lang = []
         # Read https://docs.djangoproject.com/en/2.1/topics/i18n/translation/#internationalization-in-python-code
         for accepted, _q in parse_accept_lang_header(accept_header):
             accept_lang.append(accepted)
+        self.context['tradukoj_accept_langs'] = accept_lang
+        return accept_lang
+
+    def compute_best_match_score(self, langtag):
+        # best_match(accept_lang, enabledlangs, min_score=50)
+        accept_lang = self.get_accept_langs()
 
         # get best accepted match for this tag
-        best = best_match(obj.langtag, accept_lang, min_score=50)
+        best = best_match(langtag, accept_lang, min_score=50)
         # get the index of matched lang
         try:
             idx = accept_lang.index(best[0])
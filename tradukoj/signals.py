@@ -1,10 +1,198 @@
-from django.db.models.signals import post_save
+from functools import partial
+from django.db import transaction
+from django.db.models.signals import post_save, pre_save, pre_delete, post_delete
 from django.dispatch import receiver
-from .models import GetTextFile
+from .cache import patch_tree_on_commit, cache_signals_suspended
+from .executors import get_import_backend, running_filter
+from .namespaces import defer_namespace_ids, invalidate_namespace_ids
+from .models import (GetTextFile, Translation, TranslationKey, BCP47, Namespace,
+                     invalidate_langtags, tombstone_location,
+                     translation_location)
 
 
 @receiver(post_save, sender=GetTextFile)
 def process_file(instance=None, **_kwargs):
-    instance.done = False
-    if instance.process_file():
-        instance.done = True
+    # queue it again, unless it is running (abandoned imports are requeued)
+    GetTextFile.objects.filter(pk=instance.pk).exclude(
+        running_filter()).update(
+            done=False,
+            done_with_errors=False,
+            started_date=None,
+            finished_date=None,
+        )
+    transaction.on_commit(partial(get_import_backend().enqueue, instance.pk))
+
+
+def _patch_on_commit(langtag, namespace, public, changes, using=None):
+    """Patch private tree (and public one if needed) once data is commited."""
+    patch_tree_on_commit(langtag, namespace, changes, False, using)
+    if public:
+        patch_tree_on_commit(langtag, namespace, changes, True, using)
+
+
+@receiver(pre_delete, sender=Translation)
+def remember_translation_location(instance=None, using=None, **_kwargs):
+    if cache_signals_suspended() or instance.pk is None:
+        return
+    instance._tradukoj_previous = translation_location(instance.pk, using)
+
+
+@receiver(post_save, sender=Translation)
+def patch_translation_cache(instance=None, using=None, **_kwargs):
+    if cache_signals_suspended():
+        return
+
+    # remembered by Translation.save
+    previous = getattr(instance, '_tradukoj_previous', None)
+    if previous and previous[6:] == (instance.key_id, instance.bcp47_id):
+        current = previous
+    else:
+        current = translation_location(instance.pk, using)
+    if previous and previous != current:
+        # key or lang switched, remove old node
+        langtag, enabled, namespace, public, key_text = previous[:5]
+        if enabled:
+            _patch_on_commit(langtag, namespace, public, [(key_text, None)],
+                             using)
+
+    langtag, enabled, namespace, public, key_text = current[:5]
+    if enabled:
+        _patch_on_commit(langtag, namespace, public,
+                         [(key_text, instance.str_translation())], using)
+
+
+@receiver(pre_delete, sender=Translation)
+def tombstone_translation(instance=None, using=None, **_kwargs):
+    # before deletion, so tombstones are deleted with their namespace or lang
+    previous = getattr(instance, '_tradukoj_previous', None)
+    if cache_signals_suspended() or not previous:
+        return
+    tombstone_location(previous, using)
+
+
+@receiver(post_delete, sender=Translation)
+def remove_translation_cache(instance=None, using=None, **_kwargs):
+    previous = getattr(instance, '_tradukoj_previous', None)
+    if cache_signals_suspended() or not previous:
+        return
+
+    langtag, enabled, namespace, public, key_text = previous[:5]
+    if enabled:
+        _patch_on_commit(langtag, namespace, public, [(key_text, None)],
+                         using)
+
+
+@receiver(pre_save, sender=TranslationKey)
+def remember_translation_key(instance=None, **_kwargs):
+    if cache_signals_suspended() or instance.pk is None:
+        return
+    instance._tradukoj_previous = TranslationKey.objects.filter(
+        pk=instance.pk).values_list('namespace__text', 'public', 'text').first()
+
+
+@receiver(post_save, sender=TranslationKey)
+def patch_translation_key_cache(instance=None,
+                                created=False,
+                                using=None,
+                                **_kwargs):
+    previous = getattr(instance, '_tradukoj_previous', None)
+    if cache_signals_suspended() or created or not previous:
+        return
+
+    old_namespace, old_public, old_text = previous
+    namespace = Namespace.objects.values_list(
+        'text', flat=True).get(pk=instance.namespace_id)
+    if previous == (namespace, instance.public, instance.text):
+        return
+
+    moved = (old_namespace, old_text) != (namespace, instance.text)
+    rows = instance.translations.filter(bcp47__enabled=True).values_list(
+        'bcp47__langtag', 'is_largue', 'small', 'largue')
+    for langtag, is_largue, small, largue in rows:
+        translation = largue if is_largue else small
+        if moved:
+            _patch_on_commit(langtag, old_namespace, old_public,
+                             [(old_text, None)], using)
+            _patch_on_commit(langtag, namespace, instance.public,
+                             [(instance.text, translation)], using)
+            continue
+
+        # only public flag has been switched
+        if not instance.public:
+            translation = None
+        patch_tree_on_commit(langtag, namespace,
+                             [(instance.text, translation)], True, using)
+
+
+@receiver(pre_save, sender=BCP47)
+def remember_bcp47(instance=None, **_kwargs):
+    if cache_signals_suspended() or instance.pk is None:
+        return
+    instance._tradukoj_previous = BCP47.objects.filter(
+        pk=instance.pk).values_list('langtag', 'enabled').first()
+
+
+@receiver(post_save, sender=BCP47)
+def invalidate_bcp47_cache(instance=None, created=False, **_kwargs):
+    previous = getattr(instance, '_tradukoj_previous', None)
+    if cache_signals_suspended() or created or not previous:
+        return
+
+    if previous == (instance.langtag, instance.enabled):
+        return
+
+    # enabled toggles affect every node of the tree, rebuild them
+    transaction.on_commit(
+        partial(Translation.invalidate_langtag_cache, previous[0]))
+    if previous[0] != instance.langtag:
+        transaction.on_commit(
+            partial(Translation.invalidate_langtag_cache, instance.langtag))
+
+
+@receiver(post_delete, sender=BCP47)
+def invalidate_deleted_bcp47_cache(instance=None, **_kwargs):
+    if cache_signals_suspended():
+        return
+    transaction.on_commit(
+        partial(Translation.invalidate_langtag_cache, instance.langtag))
+
+
+@receiver(post_save, sender=BCP47)
+@receiver(post_delete, sender=BCP47)
+def invalidate_bcp47_list(**_kwargs):
+    transaction.on_commit(invalidate_langtags)
+
+
+@receiver(post_save, sender=Namespace)
+def defer_saved_namespace_id(instance=None, using=None, **_kwargs):
+    defer_namespace_ids([instance.text], using)
+
+
+@receiver(post_save, sender=Namespace)
+@receiver(post_delete, sender=Namespace)
+def invalidate_namespace_id_cache(created=False, **_kwargs):
+    # new namespaces are not cached yet
+    if not created:
+        transaction.on_commit(invalidate_namespace_ids)
+
+
+@receiver(pre_save, sender=Namespace)
+def remember_namespace(instance=None, **_kwargs):
+    if cache_signals_suspended() or instance.pk is None:
+        return
+    instance._tradukoj_previous = Namespace.objects.filter(
+        pk=instance.pk).values_list('text', flat=True).first()
+
+
+@receiver(post_save, sender=Namespace)
+def invalidate_namespace_cache(instance=None, created=False, **_kwargs):
+    previous = getattr(instance, '_tradukoj_previous', None)
+    if cache_signals_suspended() or created or not previous:
+        return
+
+    if previous == instance.text:
+        return
+
+    for namespace in (previous, instance.text):
+        transaction.on_commit(
+            partial(Translation.invalidate_langtag_cache, None, namespace))
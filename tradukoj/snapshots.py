@@ -0,0 +1,142 @@
+"""
+Persistent tier of built JSON trees.
+
+Every built tree is saved into a TranslationSnapshot row, next to the
+namespace revision read before building it (see revisions.py). When a tree
+is missing from cache, as after a cache restart or an eviction, its snapshot
+is read by primary key and used while the namespace revision does not
+change, instead of building the tree from translations. Stale trees (soft
+expired or dirty) and forced rebuilds do not read snapshots, they are built
+from translations and their snapshots are overwritten.
+
+Writes that do not bump revisions (BCP47 and Namespace changes) delete the
+snapshots they affect, as `Translation.invalidate_langtag_cache` does.
+
+Settings:
+    TRADUKOJ_CACHE_SNAPSHOTS: save and read snapshots of trees, default
+        True.
+
+"""
+import hashlib
+from django.conf import settings
+from django.db import router
+from django.utils import timezone
+from .bulk import BATCH_SIZE, supports_ignore_conflicts
+from .cache import tree_cache_key
+
+
+def get_snapshots_enabled():
+    return getattr(settings, 'TRADUKOJ_CACHE_SNAPSHOTS', True)
+
+
+def snapshot_id(langtag, namespace, public=True):
+    return hashlib.sha1(
+        tree_cache_key(langtag, namespace, public).encode()).hexdigest()
+
+
+class Snapshots:
+    """Snapshots of a set of trees being rebuilt.
+
+    Valid snapshots of read_pairs are loaded on init into `contents`, a
+    {(langtag, namespace): (json bytes, etag)} dict. Namespace revisions of
+    the other trees are read before they are built, then `save` stores them.
+
+    """
+
+    def __init__(self, pairs, public=True, read_pairs=()):
+        from .models import Namespace, TranslationSnapshot
+
+        self.public = public
+        self.contents = {}
+        ids = {snapshot_id(*pair, public): pair for pair in pairs}
+        read_ids = {snapshot_id(*pair, public)
+                    for pair in read_pairs} & set(ids)
+        self.existing = set()
+        if len(read_ids) < len(ids):
+            # content of trees to build is not loaded
+            self.existing.update(
+                TranslationSnapshot.objects.filter(
+                    pk__in=set(ids) - read_ids).values_list('id', flat=True))
+        if read_ids:
+            for pk, namespace, revision, current, content, etag in (
+                    TranslationSnapshot.objects.filter(
+                        pk__in=read_ids).values_list(
+                            'id', 'namespace__text', 'revision',
+                            'namespace__revision', 'content', 'etag')):
+                self.existing.add(pk)
+                # renamed namespaces keep snapshots of their old name
+                if revision == current and namespace == ids[pk][1]:
+                    self.contents[ids[pk]] = (bytes(content), etag)
+
+        namespaces = {
+            namespace
+            for langtag, namespace in pairs
+            if (langtag, namespace) not in self.contents
+        }
+        self.revisions = {}
+        if namespaces:
+            self.revisions = {
+                text: (namespace_id, revision)
+                for text, namespace_id, revision in Namespace.objects.filter(
+                    text__in=namespaces).values_list('text', 'id', 'revision')
+            }
+
+    def save(self, entries):
+        """Store snapshots of built trees.
+
+        entries is a {(langtag, namespace): cache entry} dict, trees of
+        namespaces that do not exist and of langtags not enabled (as the
+        ones made up by requests) are skipped.
+
+        """
+        from .models import TranslationSnapshot, enabled_langtags
+
+        using = router.db_for_write(TranslationSnapshot)
+        updated = timezone.now()
+        langtags = set(enabled_langtags())
+        to_create = []
+        to_update = []
+        for (langtag, namespace), entry in entries.items():
+            if namespace not in self.revisions or langtag not in langtags:
+                continue
+            namespace_id, revision = self.revisions[namespace]
+            snapshot = TranslationSnapshot(
+                id=snapshot_id(langtag, namespace, self.public),
+                langtag=langtag,
+                namespace_id=namespace_id,
+                public=self.public,
+                content=entry['json'],
+                etag=entry['etag'],
+                revision=revision,
+                updated=updated,
+            )
+            if snapshot.pk in self.existing:
+                to_update.append(snapshot)
+            else:
+                to_create.append(snapshot)
+
+        if to_create:
+            # other worker could save the same snapshot meanwhile
+            TranslationSnapshot.objects.using(using).bulk_create(
+                to_create,
+                batch_size=BATCH_SIZE,
+                ignore_conflicts=supports_ignore_conflicts(using))
+        if to_update:
+            TranslationSnapshot.objects.using(using).bulk_update(
+                to_update,
+                ['namespace', 'content', 'etag', 'revision', 'updated'],
+                batch_size=BATCH_SIZE)
+
+
+def delete_snapshots(langtags=None, namespaces=None, public=None):
+    """Delete snapshots of trees, None means all of them."""
+    from .models import TranslationSnapshot
+
+    snapshots = TranslationSnapshot.objects.all()
+    if langtags is not None:
+        snapshots = snapshots.filter(langtag__in=langtags)
+    if namespaces is not None:
+        snapshots = snapshots.filter(namespace__text__in=namespaces)
+    if public is not None:
+        snapshots = snapshots.filter(public=public)
+    snapshots.delete()
@@ -1 +1,341 @@
-# Create your tests here.
+import gzip
+import json
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import skipIf
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
+from . import executors
+from .cache import brotli, is_stale, load_entry, local_cache, tree_cache_key
+from .executors import (ThreadImportBackend, claim_gettext_file,
+                        queued_gettext_files, resume_imports, run_import)
+from .models import (BCP47, GetTextFile, Namespace, Translation,
+                     TranslationKey, TranslationTombstone, enabled_langtags)
+from .namespaces import namespace_ids
+from .revisions import translation_delta
+
+PO_FILE = b'msgid "a.b"\nmsgstr "uno"\n\nmsgid "c"\nmsgstr "dos"\n'
+
+
+class Rollback(Exception):
+    pass
+
+
+class RecordingImportBackend(ThreadImportBackend):
+    """Thread backend recording enqueued files instead of importing them."""
+    enqueued = []
+
+    def enqueue(self, gettext_file_id):
+        self.enqueued.append(gettext_file_id)
+
+
+@override_settings(
+    CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'tradukoj-tests',
+        }
+    },
+    ROOT_URLCONF='tradukoj.urls',
+    TRADUKOJ_IMPORT_BACKEND='tradukoj.executors.DatabaseImportBackend',
+)
+class TradukojTestCase(TransactionTestCase):
+    """Real commits, so on_commit cache patches run as in production."""
+
+    def setUp(self):
+        cache.clear()
+        local_cache.clear()
+        namespace_ids.clear()
+        executors._backend = None  # pylint: disable=protected-access
+        self.es = BCP47.objects.create(langtag='es', enabled=True)
+        self.key = TranslationKey(init_namespace='ns', text='a.b')
+        self.key.save()
+        self.key.translate('es', 'uno')
+
+    def tearDown(self):
+        executors._backend = None  # pylint: disable=protected-access
+
+    @staticmethod
+    def public_tree(langtag='es', namespace='ns'):
+        return Translation.get_cached_public_translations(
+            langtag, namespace)[langtag][namespace]
+
+    @staticmethod
+    def cached_entry(langtag='es', namespace='ns', public=True):
+        return load_entry(tree_cache_key(langtag, namespace, public))
+
+
+class TreeCacheTests(TradukojTestCase):
+    def test_save_patches_cached_tree(self):
+        self.assertEqual(self.public_tree(), {'a': {'b': 'uno'}})
+        self.key.translate('es', 'dos')
+        entry = self.cached_entry()
+        self.assertFalse(is_stale(entry))
+        self.assertEqual(
+            json.loads(entry['json']), {'es': {'ns': {'a': {'b': 'dos'}}}})
+
+    def sibling(self):
+        key = TranslationKey(init_namespace='ns', text='a.c')
+        key.save()
+        key.translate('es', 'dos')
+        return key
+
+    def test_delete_removes_node(self):
+        self.sibling()
+        self.public_tree()
+        Translation.objects.get(key=self.key).delete()
+        entry = self.cached_entry()
+        self.assertFalse(is_stale(entry))
+        self.assertEqual(
+            json.loads(entry['json']), {'es': {'ns': {'a': {'c': 'dos'}}}})
+
+    def test_delete_of_last_branch_node_marks_tree_dirty(self):
+        self.public_tree()
+        Translation.objects.get(key=self.key).delete()
+        self.assertTrue(is_stale(self.cached_entry()))
+        self.assertEqual(self.public_tree(), {})
+
+    def test_private_keys_stay_out_of_public_tree(self):
+        self.public_tree()
+        self.key.public = False
+        self.key.save()
+        self.assertEqual(self.public_tree(), {})
+        self.assertEqual(
+            Translation.get_cached_private_translations('es', 'ns'),
+            {'es': {'ns': {'a': {'b': 'uno'}}}})
+
+    def test_key_cascade_delete_patches_tree(self):
+        self.sibling()
+        self.public_tree()
+        self.key.delete()
+        self.assertFalse(is_stale(self.cached_entry()))
+        self.assertEqual(self.public_tree(), {'a': {'c': 'dos'}})
+
+    def test_namespace_delete_marks_trees_dirty(self):
+        self.public_tree()
+        Namespace.objects.filter(text='ns').delete()
+        self.assertTrue(is_stale(self.cached_entry()))
+        self.assertEqual(self.public_tree(), {})
+
+    def test_bcp47_delete_marks_trees_dirty(self):
+        self.public_tree()
+        self.es.delete()
+        self.assertTrue(is_stale(self.cached_entry()))
+        self.assertNotIn('es', enabled_langtags())
+
+    def test_rolled_back_writes_do_not_patch(self):
+        self.public_tree()
+        with self.assertRaises(Rollback):
+            with transaction.atomic():
+                self.key.translate('es', 'dos')
+                raise Rollback()
+        self.assertEqual(self.public_tree(), {'a': {'b': 'uno'}})
+
+
+class DeltaTests(TradukojTestCase):
+    def test_changes_since_revision(self):
+        since = translation_delta('es', 'ns', 0)['revision']
+        key = TranslationKey(init_namespace='ns', text='c')
+        key.save()
+        key.translate('es', 'dos')
+        delta = translation_delta('es', 'ns', since)
+        self.assertFalse(delta['reset'])
+        self.assertEqual(delta['changed'], {'c': 'dos'})
+        self.assertEqual(delta['removed'], [])
+
+        self.key.delete()
+        delta = translation_delta('es', 'ns', delta['revision'])
+        self.assertEqual(delta['changed'], {})
+        self.assertEqual(delta['removed'], ['a.b'])
+
+    def test_blank_translations_are_removed(self):
+        since = translation_delta('es', 'ns', 0)['revision']
+        self.key.translate('es', ' ')
+        delta = translation_delta('es', 'ns', since)
+        self.assertEqual(delta['changed'], {})
+        self.assertEqual(delta['removed'], ['a.b'])
+
+    def test_unknown_revision_resets(self):
+        delta = translation_delta('es', 'ns', 1000)
+        self.assertTrue(delta['reset'])
+        self.assertEqual(delta['changed'], {'a.b': 'uno'})
+
+    def test_endpoint(self):
+        response = self.client.get('/public/plain/delta/', {
+            'bcp47__langtag': 'es',
+            'key__namespace__text': 'ns',
+            'since': 0,
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['changed'], {'a.b': 'uno'})
+
+
+class BulkWriteTests(TradukojTestCase):
+    def test_refresh_langtag_cache(self):
+        self.public_tree()
+        since = translation_delta('es', 'ns', 0)['revision']
+        translations = Translation.objects.filter(key=self.key)
+        translations.update(small='dos')
+        Translation.refresh_langtag_cache(translations)
+        self.assertEqual(self.public_tree(), {'a': {'b': 'dos'}})
+        self.assertEqual(
+            translation_delta('es', 'ns', since)['changed'], {'a.b': 'dos'})
+
+    def test_invalidate_langtag_cache(self):
+        self.public_tree()
+        since = translation_delta('es', 'ns', 0)['revision']
+        Translation.objects.filter(key=self.key).update(small='dos')
+        Translation.invalidate_langtag_cache(namespace='ns')
+        self.assertTrue(is_stale(self.cached_entry()))
+        self.assertEqual(self.public_tree(), {'a': {'b': 'dos'}})
+        self.assertEqual(
+            translation_delta('es', 'ns', since)['changed'], {'a.b': 'dos'})
+
+    def test_queryset_delete_writes_tombstones(self):
+        key = TranslationKey(init_namespace='ns', text='a.c')
+        key.save()
+        key.translate('es', 'dos')
+        self.public_tree()
+        TranslationKey.objects.filter(namespace__text='ns',
+                                      text='a.b').delete()
+        self.assertEqual(
+            list(TranslationTombstone.objects.values_list('key_text',
+                                                          flat=True)),
+            ['a.b'])
+        self.assertFalse(is_stale(self.cached_entry()))
+        self.assertEqual(self.public_tree(), {'a': {'c': 'dos'}})
+
+    def test_bulk_translate(self):
+        self.assertEqual(enabled_langtags(), ('es', ))
+        self.public_tree()
+        TranslationKey.objects.bulk_translate({
+            ('ns', 'a.b'): {
+                'es': 'dos',
+                'fr': 'deux'
+            },
+        })
+        self.assertEqual(enabled_langtags(), ('es', 'fr'))
+        self.assertEqual(self.public_tree(), {'a': {'b': 'dos'}})
+        self.assertEqual(self.public_tree('fr'), {'a': {'b': 'deux'}})
+
+
+class ImportTests(TradukojTestCase):
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        media = override_settings(MEDIA_ROOT=self.media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.addCleanup(shutil.rmtree, self.media_root)
+
+    def upload(self):
+        gettext_file = GetTextFile(
+            bcp47=self.es, namespace=Namespace.objects.get(text='ns'))
+        gettext_file.file.save('file.po', ContentFile(PO_FILE))
+        return gettext_file
+
+    def test_upload_is_queued_and_imported(self):
+        gettext_file = self.upload()
+        self.assertEqual(queued_gettext_files(), [gettext_file.pk])
+
+        run_import(gettext_file.pk)
+        gettext_file.refresh_from_db()
+        self.assertTrue(gettext_file.done)
+        self.assertIsNotNone(gettext_file.finished_date)
+        self.assertEqual(queued_gettext_files(), [])
+        self.assertEqual(self.public_tree(), {'a': {'b': 'uno'}, 'c': 'dos'})
+
+    def test_running_import_blocks_its_langtag(self):
+        first = self.upload()
+        second = self.upload()
+        self.assertIsNotNone(claim_gettext_file(first.pk))
+        self.assertIsNone(claim_gettext_file(first.pk))
+        self.assertIsNone(claim_gettext_file(second.pk))
+        self.assertEqual(queued_gettext_files(), [second.pk])
+
+    @override_settings(TRADUKOJ_IMPORT_CLAIM_TIMEOUT=60)
+    def test_abandoned_import_is_claimed_again(self):
+        gettext_file = self.upload()
+        GetTextFile.objects.filter(pk=gettext_file.pk).update(
+            started_date=timezone.now() - timedelta(seconds=120))
+        self.assertEqual(queued_gettext_files(), [gettext_file.pk])
+        with self.assertLogs('tradukoj', 'WARNING'):
+            self.assertIsNotNone(claim_gettext_file(gettext_file.pk))
+        self.assertEqual(queued_gettext_files(), [])
+
+    @override_settings(TRADUKOJ_IMPORT_CLAIM_TIMEOUT=60)
+    def test_save_requeues_unless_running(self):
+        gettext_file = self.upload()
+        run_import(gettext_file.pk)
+        gettext_file.refresh_from_db()
+        gettext_file.save()
+        self.assertEqual(queued_gettext_files(), [gettext_file.pk])
+
+        claim_gettext_file(gettext_file.pk)
+        gettext_file.refresh_from_db()
+        gettext_file.save()
+        self.assertEqual(queued_gettext_files(), [])
+
+        GetTextFile.objects.filter(pk=gettext_file.pk).update(
+            started_date=timezone.now() - timedelta(seconds=120))
+        gettext_file.refresh_from_db()
+        gettext_file.save()
+        gettext_file.refresh_from_db()
+        self.assertIsNone(gettext_file.started_date)
+
+    @override_settings(
+        TRADUKOJ_IMPORT_BACKEND='tradukoj.tests.RecordingImportBackend')
+    def test_resume_enqueues_queued_files(self):
+        RecordingImportBackend.enqueued = []
+        gettext_file = self.upload()
+        RecordingImportBackend.enqueued = []
+        resume_imports()
+        self.assertEqual(RecordingImportBackend.enqueued, [gettext_file.pk])
+
+
+class PlainEndpointTests(TradukojTestCase):
+    url = '/public/plain/'
+    params = {'bcp47__langtag': 'es', 'key__namespace__text': 'ns'}
+
+    def test_etag(self):
+        response = self.client.get(self.url, self.params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            json.loads(response.content), {'es': {'ns': {'a': {'b': 'uno'}}}})
+        etag = response['ETag']
+
+        response = self.client.get(
+            self.url, self.params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.key.translate('es', 'dos')
+        response = self.client.get(
+            self.url, self.params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_gzip(self):
+        plain = self.client.get(self.url, self.params)
+        response = self.client.get(
+            self.url, self.params, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertNotEqual(response['ETag'], plain['ETag'])
+
+    @skipIf(brotli is None, 'brotli is not installed')
+    def test_brotli(self):
+        plain = self.client.get(self.url, self.params)
+        response = self.client.get(
+            self.url, self.params, HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(response.content), plain.content)
+
+    def test_refused_encoding(self):
+        response = self.client.get(
+            self.url, self.params, HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertFalse(response.has_header('Content-Encoding'))
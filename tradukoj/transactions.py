@@ -0,0 +1,46 @@
+"""
+State collected along a transaction and used once it commits.
+
+Buffers are kept on the db connection per transaction (and savepoint)
+context, next to an on_commit hook that flushes them. Django discards hooks
+of rolled back savepoints, and so buffers of rolled back writes are never
+flushed.
+
+"""
+from django.db import transaction
+
+
+def _hook_pending(connection, hook):
+    return any(item[1] is hook for item in connection.run_on_commit)
+
+
+def transaction_buffer(name, flush=None, using=None):
+    """Return a dict living until current transaction commits, or None
+    outside transactions.
+
+    flush(buffer) is called once the transaction commits. Entering a
+    savepoint starts a new buffer, flushed after the previous ones.
+
+    """
+    connection = transaction.get_connection(using)
+    if not connection.in_atomic_block:
+        return None
+
+    buffers = connection.__dict__.setdefault('_tradukoj_buffers', {})
+    sids = tuple(connection.savepoint_ids)
+    current = buffers.get(name)
+    if (current is not None and current[0] == sids
+            and _hook_pending(connection, current[1])):
+        return current[2]
+
+    data = {}
+
+    def hook():
+        if buffers.get(name, (None, None, None))[2] is data:
+            del buffers[name]
+        if flush is not None:
+            flush(data)
+
+    buffers[name] = (sids, hook, data)
+    transaction.on_commit(hook, using=using)
+    return data
@@ -0,0 +1,100 @@
+"""
+Helpers to handle the JSON tree of translations.
+
+A translation key like `login.form.username` is stored into the tree as:
+{'login': {'form': {'username': 'translation'}}}
+
+"""
+
+
+def insert_node(root, key_text, value, strict=False):
+    """Put value into the tree at the path described by key_text.
+
+    When strict is False the behaviour of the full tree generation is kept:
+    a string found where a dict is expected is overwritten with a dict.
+
+    When strict is True conflicting paths are not touched and False is
+    returned, so the caller can decide to rebuild the whole tree.
+
+    """
+    deep = key_text.split('.')
+    _current_node = root
+    for i, element in enumerate(deep):
+        # en el último elemento dejamos de profundizar y colocamos la traducción
+        if i == (len(deep) - 1):
+            # Incongruity key error.
+            # _current_node debe ser un dict,
+            # de lo contrario algo ha ido mal.
+            # Posibles causas:
+            # 1) Existe una key node1.node2 = text y otra
+            #    node1.node2.node3 = text
+            #    con lo cual el algoritmo espera que node1.node2
+            #    sea un dict para añadirle una nueva clave, pero
+            #    se encuentra un string
+            if not isinstance(_current_node, dict):
+                return False
+            if strict and isinstance(_current_node.get(element), dict):
+                return False
+            _current_node[element] = value
+            return True
+        if not element in _current_node:
+            _current_node[element] = {}
+
+        # Solución parcial para gestionar
+        # el fallo Incongruity key (arriba)
+        # Si encuentra un elemento que se espera sea dict y no lo es,
+        # sobreescribir como dict.
+        # Esto provocará que node1.text2 = "text" se sobreescriba con
+        # node1.text2 = {} para poder profundizar en el árbol
+        # TODO: buscar cómo gestionar esto en Tradukoj
+        # Opción 1: evitar keys node1.node2 si existe node1.node2.node3
+        #           mediante validación en modelo
+        # Opción 2: devolver un array [{traducciones}, {traducciones}]
+        #           donde en el primer dict devolver las traduccionnes
+        #           normales node1.node2.node3 y en el segundo dict
+        #            devolver node1.node2
+        if not isinstance(_current_node[element], dict):
+            if strict:
+                return False
+            _current_node[element] = {}
+
+        # aquí está la magia, la variable _current_node es seteada por referencia
+        _current_node = _current_node[element]
+    return True
+
+
+def remove_node(root, key_text):
+    """Remove the string found at the path described by key_text.
+
+    Return False when the removal would leave an empty branch: a full
+    rebuild could show a shadowed `node1.node2` key there, so the caller
+    should rebuild the tree instead of patching it.
+
+    """
+    deep = key_text.split('.')
+    _current_node = root
+    for element in deep[:-1]:
+        _current_node = _current_node.get(element)
+        if not isinstance(_current_node, dict):
+            # nothing stored on this path
+            return True
+
+    if not isinstance(_current_node.get(deep[-1]), str):
+        # missing or shadowed by a deeper key, nothing to do
+        return True
+
+    if len(deep) > 1 and len(_current_node) == 1:
+        return False
+
+    del _current_node[deep[-1]]
+    return True
+
+
+def merge_trees(base, override):
+    """Merge override tree into base tree, override nodes win."""
+    for element, value in override.items():
+        if isinstance(value, dict) and isinstance(base.get(element), dict):
+            merge_trees(base[element], value)
+            continue
+        base[element] = value
+    return base
@@ -17,10 +17,26 @@ urlpatterns = [
     ), name="public_tradukoj_translation_plain_list"),
 
 
+    url(r'^public/plain/batch/$', classviews.PublicTranslationRawBatchList.as_view(
+    ), name="public_tradukoj_translation_plain_batch_list"),
+
+
+    url(r'^public/plain/delta/$', classviews.PublicTranslationRawDeltaList.as_view(
+    ), name="public_tradukoj_translation_plain_delta_list"),
+
+
     url(r'^private/plain/$', classviews.PrivateTranslationRawList.as_view(
     ), name="private_tradukoj_translation_plain_list"),
 
 
+    url(r'^private/plain/batch/$', classviews.PrivateTranslationRawBatchList.as_view(
+    ), name="private_tradukoj_translation_plain_batch_list"),
+
+
+    url(r'^private/plain/delta/$', classviews.PrivateTranslationRawDeltaList.as_view(
+    ), name="private_tradukoj_translation_plain_delta_list"),
+
+
     url(r'^private/$', classviews.PrivateTranslationList.as_view(),
         name="private_tradukoj_translation_list"),
 
@@ -0,0 +1,132 @@
+"""
+Cache warm-up of JSON trees.
+
+Build public and private trees of every enabled langtag and namespace, so
+first requests after a deploy or a cache flush do not pay for them. Trees
+already cached and not stale are skipped, as the ones being rebuilt by other
+worker.
+
+Settings:
+    TRADUKOJ_WARM_WORKERS: threads building trees, default 4.
+    TRADUKOJ_WARM_ON_STARTUP: warm cache in a background thread on the first
+        request of each process, so management commands never do it,
+        default False.
+    TRADUKOJ_WARM_ON_MIGRATE: warm cache after `migrate` command, default
+        False.
+
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import request_started
+from django.db import close_old_connections
+from .cache import (acquire_lock, is_entry, is_stale, rebuild_tree,
+                    release_lock, tree_cache_key)
+
+logger = logging.getLogger(__name__)
+
+STATUS_BUILT = 'built'
+STATUS_CURRENT = 'current'
+STATUS_BUSY = 'busy'
+
+
+def get_warm_workers():
+    return getattr(settings, 'TRADUKOJ_WARM_WORKERS', 4)
+
+
+def warm_tree(langtag, namespace, public=True, snapshot=False):
+    """Build a tree unless other worker is building it.
+
+    snapshot reads the tree from its current snapshot if any, set it only
+    when the tree is missing from cache. Return (status, seconds).
+
+    """
+    from .models import Translation
+
+    start = time.monotonic()
+    cache_key = tree_cache_key(langtag, namespace, public)
+    token = acquire_lock(cache_key)
+    if token is None:
+        return STATUS_BUSY, time.monotonic() - start
+
+    try:
+        rebuild_tree(
+            langtag, namespace,
+            partial(Translation.build_langtag_tree, langtag, namespace,
+                    public), public, snapshot)
+    finally:
+        release_lock(cache_key, token)
+        close_old_connections()
+    return STATUS_BUILT, time.monotonic() - start
+
+
+def warm_cache(workers=None, force=False, callback=None):
+    """Build public and private trees of enabled langtags and namespaces.
+
+    Trees cached and not stale are skipped, unless force is set. callback is
+    called with (langtag, namespace, public, status, seconds) of each tree.
+
+    Return a {status: count} dict.
+
+    """
+    from .models import Namespace, enabled_langtags
+
+    trees = [(langtag, namespace, public)
+             for public in (True, False)
+             for langtag in enabled_langtags()
+             for namespace in Namespace.objects.order_by('text').values_list(
+                 'text', flat=True)]
+    counts = dict.fromkeys((STATUS_BUILT, STATUS_CURRENT, STATUS_BUSY), 0)
+
+    def done(tree, status, seconds):
+        counts[status] += 1
+        if callback is not None:
+            callback(*tree, status, seconds)
+
+    # (tree, read snapshot) tuples, forced trees are built from translations
+    pending = [(tree, False) for tree in trees]
+    if not force:
+        cached = cache.get_many([tree_cache_key(*tree) for tree in trees])
+        pending = []
+        for tree in trees:
+            entry = cached.get(tree_cache_key(*tree))
+            if not is_entry(entry):
+                pending.append((tree, True))
+            elif is_stale(entry):
+                pending.append((tree, False))
+            else:
+                done(tree, STATUS_CURRENT, 0.0)
+
+    with ThreadPoolExecutor(
+            max_workers=workers or get_warm_workers(),
+            thread_name_prefix='tradukoj-warm') as executor:
+        futures = [(tree, executor.submit(warm_tree, *tree, snapshot))
+                   for tree, snapshot in pending]
+        for tree, future in futures:
+            done(tree, *future.result())
+    return counts
+
+
+def warm_cache_in_background():
+    def run():
+        try:
+            warm_cache()
+        except Exception:  # pylint: disable=broad-except
+            logger.exception('Error warming tradukoj cache')
+        finally:
+            close_old_connections()
+
+    threading.Thread(target=run, name='tradukoj-warm', daemon=True).start()
+
+
+def warm_cache_on_first_request(**_kwargs):
+    request_started.disconnect(dispatch_uid='tradukoj_warm_on_startup')
+    warm_cache_in_background()
+
+
+def warm_cache_after_migrate(**_kwargs):
+    warm_cache()